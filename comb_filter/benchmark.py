@@ -0,0 +1,213 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Benchmarks of the comb filter functions and the GUI update, results are written as JSON
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+import scipy
+
+from scipy import signal
+
+from combfilter import design_filter, combfilter, CombResponse, comb_zpk, sparse_lfilter, polyphase_lfilter
+from combprecision import q15_coefficients, to_q15, comb_lfilter, comb_lfilter_q15
+
+
+# Time a function - best and median over repeat runs, each run calls it number times
+def measure(func, repeat=5, number=1):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return dict(best_s=min(times), median_s=float(np.median(times)), repeat=repeat, number=number)
+
+
+# The prototype filters, FIR band stop with numtaps taps and the IIR notch of main()
+def prototypes(numtaps_list, f_s=10000):
+    for numtaps in numtaps_list:
+        yield 'fir', numtaps, design_filter('fir', 1000, 4000, f_s, numtaps=numtaps)
+    yield 'iir', 3, design_filter('iir', 2500, 4000, f_s, Q=20)
+
+
+# Coefficient, response and pole/zero benchmarks - the expanded coefficients against the prototype based paths
+def bench_design(factors, numtaps_list, repeat):
+    results = []
+    for type, numtaps, (b, a) in prototypes(numtaps_list):
+        response = CombResponse(b, a)
+        zpk = signal.tf2zpk(b, a)
+
+        for factor in factors:
+            b_comb, a_comb = combfilter(b, a, factor)
+            cases = dict(
+                combfilter=lambda: combfilter(b, a, factor),
+                freqz=lambda: signal.freqz(b_comb, a_comb),
+                comb_response=lambda: response.freqz(factor),
+                tf2zpk=lambda: signal.tf2zpk(b_comb, a_comb),
+                comb_zpk=lambda: comb_zpk(*zpk, factor),
+            )
+            for name, func in cases.items():
+                # tf2zpk gets very slow for long FIR combs, fewer runs are enough there
+                runs = 1 if name == 'tf2zpk' and b_comb.shape[0] > 1000 else repeat
+                results.append(dict(bench=name, type=type, numtaps=numtaps, factor=factor, **measure(func, runs)))
+    return results
+
+
+# Filter throughput on long signals - lfilter on the expanded coefficients against the sparse paths
+def bench_filtering(factors, numtaps_list, lengths, repeat):
+    results = []
+    rng = np.random.default_rng(0)
+    for n in lengths:
+        x = rng.standard_normal(n)
+        for type, numtaps, (b, a) in prototypes(numtaps_list):
+            for factor in factors:
+                b_comb, a_comb = combfilter(b, a, factor)
+                cases = dict(
+                    lfilter=lambda: signal.lfilter(b_comb, a_comb, x),
+                    sparse_lfilter=lambda: sparse_lfilter(b, a, factor, x),
+                    polyphase_lfilter=lambda: polyphase_lfilter(b, a, factor, x),
+                )
+                for name, func in cases.items():
+                    result = measure(func, repeat)
+                    result['samples_per_s'] = n / result['best_s']
+                    results.append(dict(bench=name, type=type, numtaps=numtaps, factor=factor, n=n, **result))
+    return results
+
+
+# Throughput of the reduced precision paths - the Q15 path is checked against the int16 recursion
+# on input that saturates, it must stay within max_lsb of it
+def bench_precision(factors, numtaps_list, lengths, repeat, max_lsb=8, check_n=10000):
+    results = []
+    rng = np.random.default_rng(0)
+    saturating = to_q15(rng.standard_normal(check_n) * 0.5)
+    for n in lengths:
+        x = rng.standard_normal(n) * 0.1
+        x_q15 = to_q15(x)
+        for type, numtaps, (b, a) in prototypes(numtaps_list):
+            q15 = q15_coefficients(b, a)
+            for factor in factors:
+                exact = comb_lfilter_q15(*q15, factor, saturating, exact=True)
+                deviation = int(np.max(np.abs(comb_lfilter_q15(*q15, factor, saturating).astype(int) - exact)))
+                if deviation > max_lsb:
+                    raise AssertionError('q15 %s taps=%d factor=%d is %d LSB from the int16 recursion'
+                                         % (type, numtaps, factor, deviation))
+
+                cases = dict(
+                    float64=lambda: comb_lfilter(b, a, factor, x, 'float64'),
+                    float32=lambda: comb_lfilter(b, a, factor, x, 'float32'),
+                    q15=lambda: comb_lfilter(b, a, factor, x_q15, 'q15'),
+                )
+                for name, func in cases.items():
+                    result = measure(func, repeat)
+                    result['samples_per_s'] = n / result['best_s']
+                    if name == 'q15':
+                        result['max_lsb'] = deviation
+                    results.append(dict(bench='precision_' + name, type=type, numtaps=numtaps, factor=factor, n=n,
+                                        **result))
+    return results
+
+
+# End to end latency of MainWindow.IIRplotsUpdate / FIRplotsUpdate on the Qt offscreen platform
+# Every run switches between factor and factor+1, so the comb filter data is always rebuilt -
+# cold clears the DesignCache before each run, warm reads responses and roots from it
+def bench_gui(factors, repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets
+    from combcache import default_cache
+    import testcombfilter
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    window = testcombfilter.MainWindow()
+    window.addFilter(1000, 4000, 10000, 1 / 10000, 'r', 'fir', 20)
+    window.addFilter(2500, 4000, 10000, 1 / 10000, 'r', 'iir', 20)
+    window.iir_comb_checkbox.setChecked(True)
+    window.fir_comb_checkbox.setChecked(True)
+    window.canvas.draw()
+    app.processEvents()
+
+    results = []
+    for type, update in (('iir', window.IIRplotsUpdate), ('fir', window.FIRplotsUpdate)):
+        for factor in factors:
+            # Warm up - the first updates of both factors may grow the axes and render the whole figure
+            for f in (factor + 1, factor):
+                update(f)
+                app.processEvents()
+
+            for cache in ('cold', 'warm'):
+                current = [factor]
+
+                def run():
+                    if cache == 'cold':
+                        default_cache.clear()
+                    current[0] = factor + factor + 1 - current[0]
+                    update(current[0])
+                    app.processEvents()
+                results.append(dict(bench='gui_update_' + cache, type=type, factor=factor, **measure(run, repeat)))
+
+    window.close()
+    return results
+
+
+# Compare two result files - one line per benchmark with the ratio new / old
+def compare(old_path, new_results):
+    with open(old_path) as fid:
+        old = json.load(fid)['results']
+
+    def key(r):
+        return (r['bench'], r.get('type'), r.get('numtaps'), r.get('factor'), r.get('n'))
+    old = {key(r): r for r in old}
+
+    for r in new_results:
+        if key(r) in old:
+            ratio = r['best_s'] / old[key(r)]['best_s']
+            flag = '  SLOWER' if ratio > 1.2 else ''
+            print('%-18s %-3s taps=%-4s factor=%-4s n=%-9s %7.2fx%s' % (key(r) + (ratio, flag)))
+
+
+# ---------------------------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the comb filter functions and the GUI update.')
+    parser.add_argument('--factors', type=int, nargs='+', default=[0, 1, 10, 50, 100], help='comb factors')
+    parser.add_argument('--numtaps', type=int, nargs='+', default=[37, 101], help='FIR prototype lengths')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[100000, 1000000], help='signal lengths for lfilter')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark')
+    parser.add_argument('--no-gui', action='store_true', help='skip the MainWindow benchmark')
+    parser.add_argument('--output', default='bench_results.json', help='JSON result file')
+    parser.add_argument('--compare', default=None, help='earlier JSON result file to compare against')
+    args = parser.parse_args(argv)
+
+    results = bench_design(args.factors, args.numtaps, args.repeat)
+    results += bench_filtering(args.factors, args.numtaps, args.lengths, args.repeat)
+    results += bench_precision(args.factors, args.numtaps, args.lengths, args.repeat)
+    if not args.no_gui:
+        results += bench_gui(args.factors, args.repeat)
+
+    meta = dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(),
+                numpy=np.__version__, scipy=scipy.__version__, machine=platform.machine(),
+                processor=platform.processor(), cpus=os.cpu_count(), args=vars(args))
+    with open(args.output, 'w') as fid:
+        json.dump(dict(meta=meta, results=results), fid, indent=1)
+    print('%d results written to %s' % (len(results), args.output))
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
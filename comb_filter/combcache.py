@@ -0,0 +1,160 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Memory bounded LRU cache for comb filter coefficients, responses and roots
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import hashlib
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from scipy.signal import tf2zpk
+
+from combfilter import combfilter, comb_zpk, CombResponse, _prototype
+
+
+# Least recently used cache, bounded by the bytes of the numpy arrays it holds
+class DesignCache(object):
+    """
+    Cached arrays are made read-only, since every caller gets the same objects.
+
+    Parameters
+    ----------
+    max_bytes:    int, the least recently used entries are dropped above this size
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    # Content hash of the prototype and the parameters - numbers as float, so f_s=10000 and f_s=10000.0 match
+    @staticmethod
+    def key(kind, b, a, *params):
+        b, a = _prototype(b, a)
+        params = tuple(float(p) for p in params)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(b.tobytes())
+        digest.update(b'|')
+        digest.update(a.tobytes())
+        digest.update(repr((kind,) + params).encode())
+        return digest.hexdigest()
+
+    # Bytes of all arrays in value, also inside tuples and objects with a __dict__
+    @classmethod
+    def size(cls, value):
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (tuple, list)):
+            return sum(cls.size(v) for v in value)
+        if hasattr(value, '__dict__'):
+            return sum(cls.size(v) for v in vars(value).values())
+        return 0
+
+    @classmethod
+    def freeze(cls, value):
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        elif isinstance(value, (tuple, list)):
+            for v in value:
+                cls.freeze(v)
+        elif hasattr(value, '__dict__'):
+            for v in vars(value).values():
+                cls.freeze(v)
+        return value
+
+    def get(self, key, compute):
+        """
+        Parameters
+        ----------
+        key:          string, from DesignCache.key
+        compute:      function without arguments, called on a miss
+
+        Returns
+        ---------
+        value:        the cached or computed value
+        """
+
+        value = self.lookup(key)
+        if value is None:
+            # Compute outside the lock, two threads may compute the same value, the last one wins
+            value = self.put(key, compute())
+        return value
+
+    # Cached value of key or None - counts as a hit or a miss like get
+    def lookup(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            self.misses += 1
+        return None
+
+    # Store a value computed elsewhere, e.g. one row of a batch - returns the frozen value
+    def put(self, key, value):
+        value = self.freeze(value)
+        size = self.size(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, dropped) = self.entries.popitem(last=False)
+                self.bytes -= dropped
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, entries=len(self.entries),
+                        bytes=self.bytes, hit_rate=self.hits / total if total else 0.0)
+
+
+# One cache for the whole process - the GUI, the sweep and the CLI tools share it
+default_cache = DesignCache()
+
+
+# Cached combfilter(b, a, factor)
+def cached_combfilter(b, a, factor, cache=default_cache):
+    return cache.get(cache.key('ba', b, a, factor), lambda: combfilter(b, a, factor))
+
+
+# Cached prototype response, the comb filter responses of all factors are read from it
+def cached_response(b, a, f_s, worN=512, cache=default_cache):
+    return cache.get(cache.key('response', b, a, f_s, worN), lambda: CombResponse(b, a, worN, f_s))
+
+
+# Cached comb filter response - freq, h like signal.freqz(*combfilter(b, a, factor), worN=worN, fs=f_s)
+def cached_freqz(b, a, factor, f_s, worN=512, cache=default_cache):
+    # Only h is stored, freq belongs to the cached response and is counted there
+    response = cached_response(b, a, f_s, worN, cache)
+    return response.freq, cache.get(cache.key('freqz', b, a, factor, f_s, worN), lambda: response.freqz(factor)[1])
+
+
+# Cached zeros, poles and gain of the comb filter
+def cached_zpk(b, a, factor, cache=default_cache):
+    prototype = cache.get(cache.key('zpk', b, a, 0), lambda: tf2zpk(*_prototype(b, a)))
+    if factor == 0:
+        return prototype
+    return cache.get(cache.key('zpk', b, a, factor), lambda: comb_zpk(*prototype, factor))
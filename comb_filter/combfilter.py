@@ -11,20 +11,61 @@
 # Date          : 17.04.2021
 # Literature    : none
 
+import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from scipy.signal import lfilter, tf2zpk, freqz, firwin, iirnotch, tf2sos, sosfilt, sosfreqz
+
+# Design the prototype filter - FIR band stop or IIR notch, as in the GUI
+def design_filter(type, f_0, f_1, f_s, Q=1, numtaps=37):
+    """
+    Parameters
+    ----------
+    type:         string, 'fir' or 'iir'
+    f_0,f_1:      double, band edges of the FIR band stop, f_0 is the notch frequency of the IIR filter
+    f_s:          double, sampling frequency
+    Q:            double, quality factor of the IIR notch
+    numtaps:      int, length of the FIR filter
+
+    Returns
+    ---------
+    b,a:          array[double], filter coefficients of the single section filter, a = 1 for FIR
+    """
+
+    if type == 'fir':
+        a = 1
+        b = firwin(numtaps, [f_0, f_1], fs=f_s, window=('kaiser', 8))
+    elif type == 'iir':
+        b, a = iirnotch(f_0, Q, f_s)
+    else:
+        raise ValueError("unknown filter type '%s', use 'fir' or 'iir'" % type)
+
+    return b, a
+
 
 # calculate a Fourier Series for a Square Signal
-def combfilter(b, a, factor):
+def combfilter(b, a, factor, output='ba', dtype=float):
     """
     Parameters
     ----------
     b,a:          array[double], filter coefficients of an single section filter
     factor:       int, repetition factor of the comb filter
+    output:       string, 'ba' for the expanded coefficients, 'sos' for second order sections
+    dtype:        numpy dtype of the expanded coefficients, e.g. np.float32, see combprecision
 
     Returns
     ---------
     b,a:          array[double], filter coefficients transformed to a comb filter
+    sos,M:        only for output='sos' - array[double], second order sections of the prototype and
+                  int, the delay M = factor+1 every section is used in, for comb_sosfilt and comb_sosfreqz -
+                  not for signal.sosfilt, the sections alone are the prototype and not the comb filter
     """
+
+    # The sections stay short, the delay M is applied by comb_sosfilt / comb_sosfreqz
+    if output == 'sos':
+        return tf2sos(*_prototype(b, a)), factor + 1
+    elif output != 'ba':
+        raise ValueError("unknown output '%s', use 'ba' or 'sos'" % output)
   
     # get length of coefficients array
     n = b.shape[0]
@@ -32,8 +73,8 @@ def combfilter(b, a, factor):
     # Create array full of zeros, length = 
     v = n + (factor * (n - 1))
 
-    a_comb = np.zeros(v)
-    b_comb = np.zeros(v)
+    a_comb = np.zeros(v, dtype=dtype)
+    b_comb = np.zeros(v, dtype=dtype)
         
     # Insert at every factor+1 position a coefficient value, the rest are zeros
     a_comb[::factor+1] = a
@@ -45,4 +86,411 @@ def combfilter(b, a, factor):
 
     b = b_comb
     
-    return b,a
\ No newline at end of file
+    return b,a
+
+
+# Bring b and a into array form, a plain int like the FIR a = 1 becomes [1.0]
+def _prototype(b, a):
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    a = np.atleast_1d(np.asarray(a, dtype=float))
+    return b, a
+
+
+# Filters a signal with the comb filter of a prototype, without zero-stuffed coefficient arrays
+class CombDelayLine(object):
+    """
+    The comb filter H(z^M) with M = factor+1 only ever combines samples that are
+    M apart, so the delay line is kept as one state column per phase (circular index
+    into the M columns) and only the prototype taps are evaluated.
+    Output matches lfilter(*combfilter(b, a, factor), x) and the state carries over
+    between calls to process().
+    Not allocation free: every call to lfilter allocates its output and final state (up to
+    three calls per process(), head, body and tail), which are then copied into y and the state.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    dtype:        numpy dtype the coefficients, state and samples are kept in, e.g. np.float32
+    """
+
+    def __init__(self, b, a, factor, dtype=float):
+        self.dtype = np.dtype(dtype)
+        self.b, self.a = (c.astype(self.dtype) for c in _prototype(b, a))
+        self.factor = factor
+        self.M = factor + 1
+        self.order = max(self.b.shape[0], self.a.shape[0]) - 1
+        self.state = None
+        self.pos = 0
+
+    def reset(self):
+        self.state = None
+        self.pos = 0
+
+    # Run the prototype filter down the rows of blocks, one state column per phase
+    def _run(self, blocks, cols):
+        if self.order == 0:
+            return lfilter(self.b, self.a, blocks, axis=0)
+        y, self.state[:, cols] = lfilter(self.b, self.a, blocks, axis=0, zi=self.state[:, cols])
+        return y
+
+    def process(self, x, out=None):
+        """
+        Parameters
+        ----------
+        x:            array[double], input samples along axis 0, further axes are channels
+        out:          array[double], optional output, same shape as x - only saves allocating the
+                      returned array, the lfilter results are still allocated and copied into it
+
+        Returns
+        ---------
+        y:            array[double], filtered samples, same shape as x
+        """
+
+        x = np.asarray(x, dtype=self.dtype)
+        if self.state is None:
+            self.state = np.zeros((self.order, self.M) + x.shape[1:], dtype=self.dtype)
+
+        y = np.empty_like(x) if out is None else out
+        n = x.shape[0]
+        m = self.M
+        i = 0
+
+        # Head - finish the row the last call stopped in
+        if self.pos != 0 and n > 0:
+            k = min(m - self.pos, n)
+            cols = slice(self.pos, self.pos + k)
+            y[:k] = self._run(x[None, :k], cols)[0]
+            i = k
+            self.pos = (self.pos + k) % m
+
+        # Body - whole rows of M samples at once
+        rows = (n - i) // m
+        if rows > 0:
+            end = i + rows * m
+            blocks = x[i:end].reshape((rows, m) + x.shape[1:])
+            y[i:end] = self._run(blocks, slice(0, m)).reshape((rows * m,) + x.shape[1:])
+            i = end
+
+        # Tail - start a new row, the rest of it follows with the next call
+        if i < n:
+            k = n - i
+            y[i:] = self._run(x[None, i:], slice(0, k))[0]
+            self.pos = k
+
+        return y
+
+
+# Filter a signal with the comb filter of b, a - same result as lfilter(*combfilter(b, a, factor), x)
+def sparse_lfilter(b, a, factor, x):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    x:            array[double], input signal, filtered along axis 0
+
+    Returns
+    ---------
+    y:            array[double], the filtered signal
+    """
+
+    return CombDelayLine(b, a, factor).process(x)
+
+
+# Zero pad x to whole rows of M samples - row j holds x[j*M : (j+1)*M], column k is phase k
+def _phase_blocks(x, m):
+    rows = -(-x.shape[0] // m)
+    blocks = np.zeros((rows * m,) + x.shape[1:], dtype=x.dtype)
+    blocks[:x.shape[0]] = x
+    return blocks.reshape((rows, m) + x.shape[1:])
+
+
+# Interleave the phases again and drop the padding - undoes _phase_blocks
+def _phase_signal(blocks, n):
+    return blocks.reshape((-1,) + blocks.shape[2:])[:n]
+
+
+# Filter some phases of the signal with the prototype filter - top level so a process pool can pickle it
+def _filter_phases(b, a, phases):
+    return lfilter(b, a, phases, axis=0)
+
+
+# Filter a signal with the comb filter of b, a by running its M interleaved phases in parallel
+def polyphase_lfilter(b, a, factor, x, workers=None, processes=False):
+    """
+    H(z^M) with M = factor+1 filters each subsequence x[k::M] on its own with the
+    prototype b, a - so the phases are split over a thread or process pool and
+    interleaved again afterwards. Same result as lfilter(*combfilter(b, a, factor), x).
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    x:            array[double], input signal, filtered along axis 0
+    workers:      int, number of workers, default is the number of cpu cores
+    processes:    bool, use a process pool instead of a thread pool
+
+    Returns
+    ---------
+    y:            array[double], the filtered signal
+    """
+
+    b, a = _prototype(b, a)
+    x = np.asarray(x, dtype=float)
+    m = factor + 1
+    blocks = _phase_blocks(x, m)
+
+    # Each worker gets a contiguous group of phases
+    workers = min(workers or os.cpu_count() or 1, m)
+    groups = np.array_split(np.arange(m), workers)
+
+    if workers == 1:
+        y = _filter_phases(b, a, blocks)
+    else:
+        y = np.empty_like(blocks)
+        Executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with Executor(max_workers=workers) as pool:
+            futures = [pool.submit(_filter_phases, b, a, blocks[:, g[0]:g[-1] + 1]) for g in groups]
+            for g, future in zip(groups, futures):
+                y[:, g[0]:g[-1] + 1] = future.result()
+
+    return _phase_signal(y, x.shape[0])
+
+
+# All M-th roots of every root in r - the roots of P(z^M) when r are the roots of P(w)
+def _mth_roots(r, m):
+    r = np.asarray(r, dtype=complex)
+    unity = np.exp(2j * np.pi * np.arange(m) / m)
+    return (np.power(r, 1.0 / m)[:, None] * unity[None, :]).ravel()
+
+
+# Calculate zeros, poles and gain of the comb filter from the zeros, poles and gain of its prototype
+def comb_zpk(z, p, k, factor):
+    """
+    The comb filter is H(z^M) with M = factor+1, so each prototype root r turns into
+    the M roots r^(1/M) * exp(j*2*pi*i/M), the gain stays the same.
+
+    Parameters
+    ----------
+    z,p,k:        array[complex], array[complex], double, zeros, poles and gain of the single section filter
+    factor:       int, repetition factor of the comb filter
+
+    Returns
+    ---------
+    z,p,k:        array[complex], array[complex], double, zeros, poles and gain of the comb filter
+    """
+
+    m = factor + 1
+    return _mth_roots(z, m), _mth_roots(p, m), k
+
+
+# Same as signal.tf2zpk(*combfilter(b, a, factor)) but only the short prototype polynomials are factored
+def combfilter_zpk(b, a, factor):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+
+    Returns
+    ---------
+    z,p,k:        array[complex], array[complex], double, zeros, poles and gain of the comb filter
+    """
+
+    z, p, k = tf2zpk(*_prototype(b, a))
+    return comb_zpk(z, p, k, factor)
+
+
+# Frequency response of all comb filters of one prototype, evaluated from one cached prototype response
+class CombResponse(object):
+    """
+    H_comb(e^jw) = H(e^jwM) with M = factor+1. The prototype is evaluated once on the
+    whole unit circle with 2*worN points, then the comb filter response at the freqz grid
+    w_i = pi*i/worN is just the prototype value at index M*i modulo 2*worN.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    worN:         int, number of frequencies, same as for signal.freqz
+    fs:           double, sampling frequency, same as for signal.freqz
+    """
+
+    def __init__(self, b, a, worN=512, fs=2 * np.pi):
+        # Own copies - a DesignCache makes the arrays of cached responses read-only
+        self.b, self.a = (np.array(c) for c in _prototype(b, a))
+        self.worN = worN
+        self.fs = fs
+
+        # Prototype on the whole unit circle - the only polynomial evaluation
+        _, self.h_whole = freqz(self.b, self.a, worN=2 * worN, whole=True)
+        self.freq = np.arange(worN) * (fs / 2) / worN
+        self.index = np.arange(worN)
+
+    def freqz(self, factor):
+        """
+        Parameters
+        ----------
+        factor:       int, repetition factor of the comb filter
+
+        Returns
+        ---------
+        freq,h:       array[double], array[complex], frequencies and response, like signal.freqz
+        """
+
+        m = factor + 1
+        return self.freq, self.h_whole[(self.index * m) % (2 * self.worN)]
+
+
+# Same as signal.freqz(*combfilter(b, a, factor), worN=worN, fs=fs) without the zero-stuffed coefficients
+def comb_freqz(b, a, factor, worN=512, fs=2 * np.pi):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    worN:         int, number of frequencies
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    freq,h:       array[double], array[complex], frequencies and response of the comb filter
+    """
+
+    return CombResponse(b, a, worN, fs).freqz(factor)
+
+
+# Filter a signal with a cascade of second order sections in z^M, M = factor+1
+def comb_sosfilt(sos, M, x):
+    """
+    Every section only combines samples that are M apart, so the M interleaved phases
+    are filtered on their own with the short prototype sections,
+    e.g. comb_sosfilt(*combfilter(b, a, factor, output='sos'), x).
+
+    Parameters
+    ----------
+    sos:          array[double], second order sections of the prototype, from combfilter(b, a, factor, output='sos')
+    M:            int, delay of the sections, factor+1
+    x:            array[double], input signal, filtered along axis 0
+
+    Returns
+    ---------
+    y:            array[double], the filtered signal
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = sosfilt(sos, _phase_blocks(x, M), axis=0)
+    return _phase_signal(y, x.shape[0])
+
+
+# Frequency response of a cascade of second order sections in z^M, M = factor+1
+def comb_sosfreqz(sos, M, worN=512, fs=2 * np.pi):
+    """
+    Parameters
+    ----------
+    sos:          array[double], second order sections of the prototype, from combfilter(b, a, factor, output='sos')
+    M:            int, delay of the sections, factor+1
+    worN:         int, number of frequencies
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    freq,h:       array[double], array[complex], frequencies and response of the comb filter
+    """
+
+    # The sections are evaluated at the wrapped frequencies w*M
+    w = np.pi * np.arange(worN) / worN
+    _, h = sosfreqz(sos, worN=np.mod(w * M, 2 * np.pi))
+    return w * fs / (2 * np.pi), h
+
+
+# Stack prototypes into 2-D arrays, one filter per row - a single a (e.g. a = 1 for FIR) is used for all rows
+def _batch_prototype(b, a):
+    b = np.atleast_2d(np.asarray(b, dtype=float))
+    a = np.atleast_2d(np.asarray(a, dtype=float))
+    if a.shape[0] == 1 and b.shape[0] > 1:
+        a = np.repeat(a, b.shape[0], axis=0)
+    return b, a
+
+
+# Zero-stuff all rows of c for all factors at once into a (filters, factors, length) array
+def _stuff_padded(c, m, length):
+    out = np.zeros((c.shape[0], m.shape[0], length))
+    positions = np.arange(c.shape[1])[None, :] * m[:, None]
+    out[:, np.arange(m.shape[0])[:, None], positions] = c[:, None, :]
+    return out
+
+
+# Zero-stuff all rows of c for all factors at once into one flat array, filter k with factor i starts at offsets[k*F+i]
+def _stuff_ragged(c, m):
+    lengths = np.tile((c.shape[1] - 1) * m + 1, c.shape[0])
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    values = np.zeros(offsets[-1])
+    positions = offsets[:-1].reshape(c.shape[0], m.shape[0])[:, :, None] + np.arange(c.shape[1])[None, None, :] * m[None, :, None]
+    values[positions] = c[:, None, :]
+    return values, offsets
+
+
+# Turn many filters into comb filters with many factors in one go
+def combfilter_batch(b, a, factors, output='padded'):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients, one filter per row - a single row of a is used for all filters
+    factors:      array[int], repetition factors of the comb filters
+    output:       string, 'padded' or 'ragged'
+
+    Returns
+    ---------
+    b,a:          'padded' - array[double] of shape (filters, factors, length), combfilter(b[k], a[k], factors[i])
+                  zero padded to the longest comb filter, ready for lfilter
+                  'ragged' - tuple (values, offsets), comb filter k with factor i is values[offsets[j]:offsets[j+1]],
+                  j = k*len(factors)+i
+    """
+
+    b, a = _batch_prototype(b, a)
+    m = np.atleast_1d(np.asarray(factors, dtype=int)) + 1
+
+    if output == 'padded':
+        length = (max(b.shape[1], a.shape[1]) - 1) * np.max(m) + 1
+        return _stuff_padded(b, m, length), _stuff_padded(a, m, length)
+    elif output == 'ragged':
+        return _stuff_ragged(b, m), _stuff_ragged(a, m)
+    else:
+        raise ValueError("unknown output '%s', use 'padded' or 'ragged'" % output)
+
+
+# Response of every row of c on n points of the whole unit circle - coefficients longer than n are folded, which is exact on the grid
+def _fft_response(c, n):
+    if c.shape[1] > n:
+        folds = -(-c.shape[1] // n)
+        padded = np.zeros((c.shape[0], folds * n))
+        padded[:, :c.shape[1]] = c
+        c = padded.reshape(c.shape[0], folds, n).sum(axis=1)
+    return np.fft.fft(c, n=n, axis=1)
+
+
+# Frequency responses of many comb filters in one go - every prototype is evaluated once, the factors are index mappings
+def comb_freqz_batch(b, a, factors, worN=512, fs=2 * np.pi):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients, one filter per row - a single row of a is used for all filters
+    factors:      array[int], repetition factors of the comb filters
+    worN:         int, number of frequencies
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    freq,h:       array[double], array[complex] of shape (filters, factors, worN), same grid as signal.freqz
+    """
+
+    b, a = _batch_prototype(b, a)
+    m = np.atleast_1d(np.asarray(factors, dtype=int)) + 1
+
+    # Prototypes on the whole unit circle with 2*worN points, the comb filters read H(e^jwM) from it
+    h_whole = _fft_response(b, 2 * worN) / _fft_response(a, 2 * worN)
+    index = (np.arange(worN)[None, :] * m[:, None]) % (2 * worN)
+
+    freq = np.arange(worN) * (fs / 2) / worN
+    return freq, h_whole[:, index]
@@ -0,0 +1,144 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Load generator for combservice - concurrent keep-alive clients on localhost, latency and throughput
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import time
+import json
+import random
+import asyncio
+import argparse
+import numpy as np
+
+from combfilter import design_filter
+
+
+# Request bodies for every endpoint - a few prototypes, so the service can batch requests of the same one
+def make_bodies(endpoint, rng, max_factor, worN):
+    """
+    Parameters
+    ----------
+    endpoint:     string, 'design', 'comb', 'response' or 'zpk'
+    rng:          random.Random
+    max_factor:   int, factors are drawn from 0 ... max_factor
+    worN:         int, number of frequencies of the response requests
+
+    Returns
+    ---------
+    body:         function without arguments that returns a new request body
+    """
+
+    prototypes = []
+    for numtaps in (37, 101):
+        b, a = design_filter('fir', 1000, 4000, 10000, numtaps=numtaps)
+        prototypes.append(dict(b=b.tolist(), a=[1.0]))
+    for Q in (5, 20):
+        b, a = design_filter('iir', 1000, 0, 10000, Q=Q)
+        prototypes.append(dict(b=b.tolist(), a=a.tolist()))
+
+    def body():
+        if endpoint == 'design':
+            return dict(type=rng.choice(['fir', 'iir']), f_0=rng.uniform(500, 1500), f_1=rng.uniform(2000, 4000),
+                        f_s=10000, Q=rng.uniform(1, 30), numtaps=rng.choice([37, 101]))
+        item = dict(rng.choice(prototypes), factor=rng.randint(0, max_factor))
+        if endpoint == 'response':
+            item.update(worN=worN, fs=10000)
+        return item
+
+    return body
+
+
+# Send one request on an open connection and read the response
+async def request(reader, writer, method, path, body=None):
+    payload = b'' if body is None else json.dumps(body).encode()
+    writer.write(b'%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                 % (method.encode(), path.encode(), len(payload)) + payload)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+# One client - sends requests back to back until the shared budget is used up
+async def client(args, endpoints, bodies, budget, latencies, errors):
+    reader, writer = await connect(args)
+    try:
+        while budget[0] > 0:
+            budget[0] -= 1
+            endpoint = endpoints[budget[0] % len(endpoints)]
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', '/' + endpoint, bodies[endpoint]())
+            latencies[endpoint].append(time.perf_counter() - start)
+            errors[endpoint] += status != 200
+    finally:
+        writer.close()
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    bodies = {name: make_bodies(name, rng, args.max_factor, args.worN) for name in args.endpoints}
+    latencies = {name: [] for name in args.endpoints}
+    errors = dict.fromkeys(args.endpoints, 0)
+    budget = [args.requests]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args, args.endpoints, bodies, budget, latencies, errors)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print('%d requests from %d clients in %.2f s, %.0f requests/s'
+          % (args.requests, args.concurrency, elapsed, args.requests / elapsed))
+    for name in args.endpoints:
+        d = np.array(latencies[name]) * 1e3
+        if d.shape[0]:
+            print('  %-9s %6d requests  %4d errors  p50 %.2f ms  p95 %.2f ms  max %.2f ms'
+                  % (name, d.shape[0], errors[name], np.percentile(d, 50), np.percentile(d, 95), np.max(d)))
+
+    reader, writer = await connect(args)
+    _, metrics = await request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    print('service metrics:')
+    print(json.dumps(metrics, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send concurrent requests to a running combservice.')
+    parser.add_argument('--host', default='127.0.0.1', help='service address')
+    parser.add_argument('--port', type=int, default=8765, help='service TCP port')
+    parser.add_argument('--unix', default=None, help='connect to this Unix socket instead of TCP')
+    parser.add_argument('--endpoints', nargs='+', default=['design', 'comb', 'response', 'zpk'],
+                        choices=['design', 'comb', 'response', 'zpk'], help='endpoints to call in turn')
+    parser.add_argument('--requests', type=int, default=2000, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=32, help='number of concurrent connections')
+    parser.add_argument('--max-factor', type=int, default=50, help='largest comb factor')
+    parser.add_argument('--worN', type=int, default=512, help='frequencies per response request')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the request bodies')
+    args = parser.parse_args(argv)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Filter model - prototype, sampling frequency and factor, everything else is computed on first use
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import numpy as np
+
+from combcache import default_cache, cached_combfilter, cached_response, cached_freqz, cached_zpk
+
+
+# A prototype filter and its comb filter - derived data is cached until an input changes
+class FilterModel(object):
+    """
+    Changing b, a, f_s or worN drops everything, changing the factor only drops the
+    comb filter data - the prototype response and its roots are kept. Coefficients,
+    responses and roots come from a DesignCache, so factors seen before are not computed again.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    f_s:          double, sampling frequency
+    factor:       int, repetition factor of the comb filter
+    worN:         int, number of frequencies of the responses
+    cache:        DesignCache, shared by all models by default
+    """
+
+    __slots__ = ('_b', '_a', '_f_s', '_factor', '_worN', '_prototype', '_comb', 'cache')
+
+    def __init__(self, b, a, f_s, factor=0, worN=512, cache=default_cache):
+        self._b = b
+        self._a = a
+        self._f_s = f_s
+        self._factor = factor
+        self._worN = worN
+        self._prototype = dict()
+        self._comb = dict()
+        self.cache = cache
+
+    # Return cache[key], compute it with func on the first access
+    @staticmethod
+    def _cached(cache, key, func):
+        if key not in cache:
+            cache[key] = func()
+        return cache[key]
+
+    def _set_prototype(self, name, value):
+        setattr(self, name, value)
+        self._prototype = dict()
+        self._comb = dict()
+
+    # Inputs
+    @property
+    def b(self):
+        return self._b
+
+    @b.setter
+    def b(self, value):
+        self._set_prototype('_b', value)
+
+    @property
+    def a(self):
+        return self._a
+
+    @a.setter
+    def a(self, value):
+        self._set_prototype('_a', value)
+
+    @property
+    def f_s(self):
+        return self._f_s
+
+    @f_s.setter
+    def f_s(self, value):
+        self._set_prototype('_f_s', value)
+
+    @property
+    def worN(self):
+        return self._worN
+
+    @worN.setter
+    def worN(self, value):
+        self._set_prototype('_worN', value)
+
+    @property
+    def factor(self):
+        return self._factor
+
+    @factor.setter
+    def factor(self, value):
+        if value != self._factor:
+            self._factor = value
+            self._comb = dict()
+
+    # Prototype data - does not depend on the factor
+    @property
+    def response(self):
+        return self._cached(self._prototype, 'response', lambda: cached_response(self._b, self._a, self._f_s, self._worN, self.cache))
+
+    @property
+    def prototype_zpk(self):
+        return self._cached(self._prototype, 'zpk', lambda: cached_zpk(self._b, self._a, 0, self.cache))
+
+    @property
+    def prototype_mag_db(self):
+        return self._cached(self._prototype, 'mag_db', lambda: 20 * np.log10(np.abs(self.response.freqz(0)[1])))
+
+    # Comb filter data
+    @property
+    def coefficients(self):
+        return self._cached(self._comb, 'ba', lambda: cached_combfilter(self._b, self._a, self._factor, self.cache))
+
+    @property
+    def freq(self):
+        return self.response.freq
+
+    @property
+    def h(self):
+        return self._cached(self._comb, 'h', lambda: cached_freqz(self._b, self._a, self._factor, self._f_s, self._worN, self.cache)[1])
+
+    @property
+    def mag_db(self):
+        return self._cached(self._comb, 'mag_db', lambda: 20 * np.log10(np.abs(self.h)))
+
+    @property
+    def phase(self):
+        return self._cached(self._comb, 'phase', lambda: np.unwrap(np.angle(self.h)))
+
+    @property
+    def zpk(self):
+        return self._cached(self._comb, 'zpk', lambda: cached_zpk(self._b, self._a, self._factor, self.cache))
+
+
+# Comb filter responses of many models in one go - for comparing many designs at the same factor
+def batch_freqz(models):
+    """
+    Models that still have their comb filter response are skipped, responses found in the
+    DesignCache are reused. For the rest the cached prototype responses of all models with the
+    same factor and worN are stacked, H(e^jwM) is read with one index operation and the
+    magnitude and phase are computed for all of them at once.
+
+    Parameters
+    ----------
+    models:       list[FilterModel]
+
+    Returns
+    ---------
+    computed:     list[FilterModel], the models whose response was computed
+    """
+
+    groups = dict()
+    for model in models:
+        if 'h' in model._comb:
+            continue
+        key = model.cache.key('freqz', model._b, model._a, model._factor, model._f_s, model._worN)
+        cached = model.cache.lookup(key)
+        if cached is not None:
+            model._comb['h'] = cached
+        else:
+            groups.setdefault((model._factor, model._worN), []).append((model, key))
+
+    computed = []
+    for (factor, worN), group in groups.items():
+        h_whole = np.stack([model.response.h_whole for model, _ in group])
+        h = h_whole[:, (np.arange(worN) * (factor + 1)) % (2 * worN)]
+        mag_db = 20 * np.log10(np.abs(h))
+        phase = np.unwrap(np.angle(h), axis=1)
+
+        # A copy of each row - a view would keep the whole stacked block alive in the cache
+        for i, (model, key) in enumerate(group):
+            model._comb['h'] = model.cache.put(key, h[i].copy())
+            model._comb['mag_db'] = mag_db[i]
+            model._comb['phase'] = phase[i]
+            computed.append(model)
+    return computed
@@ -0,0 +1,228 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Live spectrogram of a signal before and after the comb filter, streamed in real time
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import time
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from PyQt5 import QtCore
+
+
+# Square wave from its Fourier series - odd harmonics up to the Nyquist frequency, phase continuous over blocks
+class SquareSource(object):
+    def __init__(self, f_s, f=220.0, amplitude=0.5):
+        self.f_s = f_s
+        self.k = np.arange(1, int(f_s / 2 / f) + 1, 2)
+        self.weights = amplitude * 4 / np.pi / self.k
+        self.omega = 2 * np.pi * f * self.k / f_s
+        self.n = 0
+
+    def read(self, out):
+        t = np.arange(self.n, self.n + out.shape[0])
+        np.dot(self.weights, np.sin(self.omega[:, None] * t[None, :]), out=out)
+        self.n += out.shape[0]
+        return out
+
+
+# White noise
+class NoiseSource(object):
+    def __init__(self, f_s, amplitude=0.3):
+        self.f_s = f_s
+        self.amplitude = amplitude
+        self.rng = np.random.default_rng()
+
+    def read(self, out):
+        self.rng.standard_normal(out=out)
+        out *= self.amplitude
+        return out
+
+
+# WAV file, memory mapped, first channel, played in a loop at the file's own rate
+class WavSource(object):
+    def __init__(self, path):
+        from scipy.io import wavfile
+
+        self.f_s, data = wavfile.read(path, mmap=True)
+        self.data = data if data.ndim == 1 else data[:, 0]
+        # 8 bit WAVs are unsigned with the zero line at 128, like in combwav
+        self.center = 128.0 if data.dtype == np.uint8 else 0.0
+        if data.dtype == np.uint8:
+            self.scale = 1.0 / 128
+        else:
+            self.scale = 1.0 / np.iinfo(data.dtype).max if data.dtype.kind in 'iu' else 1.0
+        self.pos = 0
+
+    def read(self, out):
+        i = 0
+        while i < out.shape[0]:
+            k = min(out.shape[0] - i, self.data.shape[0] - self.pos)
+            out[i:i + k] = self.data[self.pos:self.pos + k]
+            i += k
+            self.pos = (self.pos + k) % self.data.shape[0]
+        out -= self.center
+        out *= self.scale
+        return out
+
+
+# Input and output spectrogram of a source streamed through the comb filter
+class SpectrogramMonitor(FigureCanvasQTAgg):
+    """
+    A timer pulls as many blocks from the source as fit in the elapsed time, filters them
+    with a CombStream and writes input and output into ring buffers. Every block adds one
+    spectrum column to the spectrogram rings, which are blitted at a fixed frame rate.
+    New coefficients go to the running CombStream, nothing is flushed.
+
+    Parameters
+    ----------
+    parent:       QWidget
+    block:        int, samples per block, also the hop of the spectrogram
+    nfft:         int, FFT length of a spectrogram column, a multiple of block
+    history:      int, number of spectrogram columns shown
+    fps:          int, frames per second
+    """
+
+    def __init__(self, parent=None, block=256, nfft=512, history=200, fps=25):
+        self.block = block
+        self.nfft = nfft
+        self.history = history
+        self.fps = fps
+        self.source = None
+        self.stream = None
+        self.filter = None
+
+        # Preallocated buffers - sample rings, the current block, spectrogram rings and their display copies
+        bins = nfft // 2 + 1
+        self.fft_window = np.hanning(nfft)
+        self.x = np.zeros(block)
+        self.rings = dict(input=np.zeros(nfft), output=np.zeros(nfft))
+        self.frame = np.zeros(nfft)
+        self.spectra = dict(input=np.full((bins, history), -120.0), output=np.full((bins, history), -120.0))
+        self.display = dict(input=np.full((bins, history), -120.0), output=np.full((bins, history), -120.0))
+        self.sample_pos = 0
+        self.column = 0
+        self.started = 0.0
+        self.samples_done = 0
+
+        fig = Figure(figsize=(3, 4), dpi=100)
+        fig.subplots_adjust(left=0.2, bottom=0.1, right=0.95, top=0.9, hspace=0.6)
+        super(SpectrogramMonitor, self).__init__(fig)
+        self.setParent(parent)
+
+        self.axes = dict()
+        self.images = dict()
+        for i, name in enumerate(('input', 'output')):
+            ax = fig.add_subplot(2, 1, i + 1, title='%s - Spectrogram' % name.capitalize())
+            ax.set_xlabel('Time [s]')
+            ax.set_ylabel('Frequency [Hz]')
+            image = ax.imshow(self.display[name], origin='lower', aspect='auto', vmin=-100, vmax=0,
+                              cmap='magma', animated=True)
+            self.axes[name] = ax
+            self.images[name] = image
+        self.setRate(10000)
+
+        self.backgrounds = dict()
+        self.mpl_connect('draw_event', self.onDraw)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.tick)
+
+    # Axis scaling for a sampling frequency
+    def setRate(self, f_s):
+        self.f_s = f_s
+        extent = (-self.history * self.block / f_s, 0, 0, f_s / 2)
+        for image in self.images.values():
+            image.set_extent(extent)
+        self.draw_idle()
+
+    # New filter for the running stream - crossfaded by CombStream, no restart
+    def setFilter(self, b, a, factor):
+        self.filter = (b, a, factor)
+        if self.stream is not None:
+            self.stream.set_filter(b, a, factor)
+
+    def start(self, source):
+        from combstream import CombStream
+
+        self.source = source
+        if source.f_s != self.f_s:
+            self.setRate(source.f_s)
+        if self.stream is None and self.filter is not None:
+            self.stream = CombStream(*self.filter, blocksize=self.block)
+
+        self.started = time.perf_counter()
+        self.samples_done = 0
+        self.timer.start(int(1000 / self.fps))
+
+    def stop(self):
+        self.timer.stop()
+
+    # Pull the blocks that are due by now, at most half a second worth if the GUI was blocked
+    def tick(self):
+        if self.stream is None:
+            if self.filter is None:
+                return
+            from combstream import CombStream
+            self.stream = CombStream(*self.filter, blocksize=self.block)
+
+        due = int((time.perf_counter() - self.started) * self.f_s) - self.samples_done
+        blocks = min(due // self.block, int(0.5 * self.f_s / self.block))
+        if due // self.block > blocks:
+            self.samples_done += (due // self.block - blocks) * self.block
+
+        for _ in range(blocks):
+            self.source.read(self.x)
+            y = self.stream.process(self.x)
+            self.push('input', self.x)
+            self.push('output', y)
+            self.sample_pos = (self.sample_pos + self.block) % self.nfft
+            self.column = (self.column + 1) % self.history
+            self.samples_done += self.block
+
+        if blocks:
+            self.blitImages()
+
+    # Write a block into the sample ring and the newest spectrum into the spectrogram ring
+    def push(self, name, block):
+        ring = self.rings[name]
+        ring[self.sample_pos:self.sample_pos + self.block] = block
+
+        # Oldest sample first
+        start = (self.sample_pos + self.block) % self.nfft
+        self.frame[:self.nfft - start] = ring[start:]
+        self.frame[self.nfft - start:] = ring[:start]
+        self.frame *= self.fft_window
+
+        spectrum = np.abs(np.fft.rfft(self.frame)) * (2 / np.sum(self.fft_window))
+        self.spectra[name][:, self.column] = 20 * np.log10(np.maximum(spectrum, 1e-6))
+
+    def onDraw(self, event):
+        for name, ax in self.axes.items():
+            self.backgrounds[name] = self.copy_from_bbox(ax.bbox)
+            ax.draw_artist(self.images[name])
+
+    # Oldest column on the left - copied in two slices into the display buffer, then blitted
+    def blitImages(self):
+        first = self.column
+        for name, ax in self.axes.items():
+            spectra, display = self.spectra[name], self.display[name]
+            display[:, :self.history - first] = spectra[:, first:]
+            display[:, self.history - first:] = spectra[:, :first]
+            self.images[name].set_data(display)
+
+            if name not in self.backgrounds:
+                self.draw_idle()
+                continue
+            self.restore_region(self.backgrounds[name])
+            ax.draw_artist(self.images[name])
+            self.blit(ax.bbox)
@@ -0,0 +1,71 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Plot layout and plot helpers shared by the GUI and the headless renderer - no Qt in here
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib import patches
+
+
+# Create the figure with four plots per panel - by default IIR on the left, FIR on the right
+# Layout - 4 Rows, one Column per panel
+def create_figure(width=5, height=4, dpi=100, panels=('IIR', 'FIR')):
+    """
+    Parameters
+    ----------
+    width,height: double, figure size in inches
+    dpi:          int, resolution
+    panels:       tuple[string], one column of plots per panel, the names go into the titles
+
+    Returns
+    ---------
+    fig:          matplotlib Figure
+    axes:         list, four axes per panel - for the default panels the eight axes ax1 ... ax8
+    """
+
+    # Plot and its title
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    fig.suptitle('Filters - Original Filter | Converted to comb filter')
+
+    # Format spaces between plots
+    fig.subplots_adjust(left=0.125,
+              bottom=0.1, 
+              right=0.9, 
+              top=0.9, 
+              wspace=0.2, 
+              hspace=1)
+
+    # The Plots and their formatting - per panel prototype response, comb response, comb phase and comb PZ map
+    rows = (('%s Filter - Frequency Response', 'Frequency [Hz]', 'Amplitude [dB]'),
+            ('%s Comb Filter - Frequency Response', 'Frequency [Hz]', 'Amplitude [dB]'),
+            ('%s Comb Filter - Phase Response', 'Frequency [Hz]', 'Phase [°]'),
+            ('%s Comb Filter - PZ Map', 'Imaginary', 'Real'))
+
+    axes = []
+    for column, name in enumerate(panels):
+        for row, (title, xlabel, ylabel) in enumerate(rows):
+            ax = fig.add_subplot(len(rows), len(panels), row * len(panels) + column + 1, title=title % name)
+            ax.set_xlabel(xlabel)
+            ax.set_ylabel(ylabel)
+            axes.append(ax)
+
+    return fig, axes
+
+
+# Draw a PZ map - unit circle, zeros and poles
+def plot_pz(ax, z, p, title):
+    ax.add_patch(patches.Circle((0, 0), radius=1, fill=False, color='black', ls='dashed'))
+    ax.plot(np.real(z), np.imag(z), 'oy', label='Zeros')
+    ax.plot(np.real(p), np.imag(p), 'xb', label='Poles')
+    ax.legend(loc=2)
+    ax.set(title=title, xlabel='Real', ylabel='Imaginary')
@@ -0,0 +1,305 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Reduced precision comb filters - float32 and Q15 fixed point coefficients and filtering, deviation from float64
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : Oppenheim, Schafer - Discrete-Time Signal Processing, chapter 6.7 - 6.9, effects of coefficient quantization
+
+import warnings
+import numpy as np
+
+from scipy.signal import lfilter, tf2zpk, BadCoefficients
+
+from combfilter import _prototype, _phase_blocks, _phase_signal, comb_zpk, CombDelayLine, CombResponse
+
+PRECISIONS = ('float64', 'float32', 'q15')
+
+
+# Divide by a[0], so the fixed point recursion only needs a shift for the feedback
+def _normalized(b, a):
+    b, a = _prototype(b, a)
+    return b / a[0], a / a[0]
+
+
+# Quantize b and a to int16 with a common number of fractional bits
+def q15_coefficients(b, a):
+    """
+    Q15 only covers [-1, 1), IIR feedback coefficients like a[1] of a notch are close to -2,
+    so all coefficients share a power of two scale: value = q * 2**-frac with frac <= 15.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+
+    Returns
+    ---------
+    bq,aq:        array[int16], quantized coefficients, aq[0] = 2**frac
+    frac:         int, number of fractional bits
+    """
+
+    b, a = _normalized(b, a)
+    peak = max(np.max(np.abs(b)), np.max(np.abs(a)))
+    frac = 15 - max(0, int(np.ceil(np.log2(peak * (1 + 2.0 ** -15)))))
+    scale = 2.0 ** frac
+    bq = np.clip(np.round(b * scale), -32768, 32767).astype(np.int16)
+    aq = np.clip(np.round(a * scale), -32768, 32767).astype(np.int16)
+    return bq, aq, frac
+
+
+# The coefficients as the given precision sees them, as doubles for the analysis
+def quantize(b, a, precision='float64'):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    precision:    string, 'float64', 'float32' or 'q15'
+
+    Returns
+    ---------
+    b,a:          array[double], quantized coefficients normalized to a[0] = 1
+    """
+
+    b, a = _normalized(b, a)
+    if precision == 'float64':
+        return b, a
+    elif precision == 'float32':
+        return b.astype(np.float32).astype(float), a.astype(np.float32).astype(float)
+    elif precision == 'q15':
+        bq, aq, frac = q15_coefficients(b, a)
+        return bq * 2.0 ** -frac, aq * 2.0 ** -frac
+    raise ValueError("unknown precision '%s', use one of %s" % (precision, ', '.join(PRECISIONS)))
+
+
+# Samples in [-1, 1) to int16 and back
+def to_q15(x):
+    return np.clip(np.round(np.asarray(x) * 32768.0), -32768, 32767).astype(np.int16)
+
+
+def from_q15(x):
+    return np.asarray(x, dtype=np.float32) / np.float32(32768.0)
+
+
+# Direct form I in int16 - fills the rows start ... of yy, a row of M phases at a time
+def _q15_rows(bq, aq, frac, xx, yy, start):
+    """
+    Row j of M samples only depends on the rows j-1 ... j-order before it, so the loop runs
+    over rows and every step is vectorized over the phases and channels. Bit exact, but a
+    Python loop - comb_lfilter_q15 only uses it for rows that saturate.
+
+    Parameters
+    ----------
+    bq,aq,frac:   coefficients from q15_coefficients
+    xx:           array[int64], input rows of shape (rows, M, ...), the first start rows are history
+    yy:           array[int64], output rows, same shape as xx, the rows before start are history
+    start:        int, first row to compute, at least the filter order
+    """
+
+    bq = bq.astype(np.int64)
+    aq = aq.astype(np.int64)
+    half = np.int64(1) << (frac - 1)
+    for j in range(start, xx.shape[0]):
+        acc = bq[0] * xx[j]
+        for k in range(1, bq.shape[0]):
+            acc += bq[k] * xx[j - k]
+        for k in range(1, aq.shape[0]):
+            acc -= aq[k] * yy[j - k]
+        yy[j] = np.clip((acc + half) >> frac, -32768, 32767)
+
+
+# lfilter state that continues after the input rows xh and output rows yh, newest row last
+def _history_state(b, a, xh, yh):
+    order = xh.shape[0]
+    state = np.zeros(xh.shape)
+    for k in range(order):
+        for i in range(order - k):
+            state[k] += b[k + 1 + i] * xh[-1 - i] - a[k + 1 + i] * yh[-1 - i]
+    return state
+
+
+# Fixed point comb filter - int16 samples and coefficients, rounding and saturation per output sample
+def comb_lfilter_q15(bq, aq, frac, factor, x, block=16384, exact=False):
+    """
+    The signal is filtered in blocks of whole rows of M = factor+1 samples, the integer
+    coefficients run through lfilter in float64 and every output is rounded and saturated
+    to int16. The float64 temporaries are only as large as a block, the signal itself is
+    only read and written as int16.
+    FIR filters are bit exact this way - the products and sums of int16 values stay far
+    below 2**53 and aq[0] is a power of two. IIR filters feed back the unrounded output
+    within a block and start every block from the int16 output before it, which keeps
+    them within a few LSB of the int16 recursion. A row that saturates is computed with
+    the int16 recursion and the next block starts right after it, so saturation is fed
+    back as in fixed point - inputs that saturate often are slower, e.g. 0.5 s for 200000
+    samples of noise of which 2 % saturate, against 4 ms without saturation.
+    exact=True runs the int16 recursion for the whole signal.
+
+    Parameters
+    ----------
+    bq,aq,frac:   coefficients from q15_coefficients
+    factor:       int, repetition factor of the comb filter
+    x:            array[int16], input samples along axis 0, further axes are channels
+    block:        int, samples per channel and block, at least 256 rows of M samples
+    exact:        bool, bit exact int16 recursion for the whole signal, orders of magnitude slower for IIR
+
+    Returns
+    ---------
+    y:            array[int16], filtered samples, same shape as x
+    """
+
+    x = np.asarray(x)
+    if x.dtype != np.int16:
+        raise ValueError("q15 filtering needs int16 samples, got %s - see to_q15" % x.dtype)
+
+    m = factor + 1
+    rows = -(-x.shape[0] // m)
+    order = max(bq.shape[0], aq.shape[0]) - 1
+    if exact and aq.shape[0] > 1:
+        xx = np.zeros((order + rows, m) + x.shape[1:], dtype=np.int64)
+        xx[order:] = _phase_blocks(x, m)
+        yy = np.zeros_like(xx)
+        _q15_rows(bq, aq, frac, xx, yy, order)
+        return _phase_signal(yy[order:], x.shape[0]).astype(np.int16)
+
+    b = bq.astype(float)
+    a = aq.astype(float)
+    iir = aq.shape[0] > 1
+    b_n, a_n = np.zeros(order + 1), np.zeros(order + 1)
+    b_n[:b.shape[0]], a_n[:a.shape[0]] = b / a[0], a / a[0]
+
+    # FIR: the lfilter state is exact - IIR: the last order rows of input and int16 output
+    state = np.zeros((order, m) + x.shape[1:])
+    xh = np.zeros((order, m) + x.shape[1:], dtype=np.int64)
+    yh = np.zeros_like(xh)
+
+    y = np.empty_like(x)
+    most = max(256, block // m)
+    window = most
+    pos = 0
+    while pos < rows:
+        k = min(window, rows - pos)
+        xb = _phase_blocks(x[pos * m:(pos + k) * m], m)
+        if iir:
+            state = _history_state(b_n, a_n, xh, yh)
+        if order == 0:
+            v = lfilter(b, a, xb, axis=0)
+        else:
+            v, state = lfilter(b, a, xb, axis=0, zi=state)
+        yb = np.floor(v + 0.5)
+
+        if iir:
+            # Up to the first saturated row the block holds, that row follows the int16 recursion
+            over = (yb > 32767) | (yb < -32768)
+            saturated = np.flatnonzero(over.reshape(k, -1).any(axis=1))
+            if saturated.shape[0]:
+                k = saturated[0] + 1
+                xb, yb = xb[:k], yb[:k]
+                xx = np.concatenate((xh, xb))
+                yy = np.concatenate((yh, yb.astype(np.int64)))
+                _q15_rows(bq, aq, frac, xx, yy, order + k - 1)
+                yb[-1] = yy[-1]
+                window = max(1, min(most, 16))
+            else:
+                window = min(most, 2 * window)
+        np.clip(yb, -32768, 32767, out=yb)
+
+        if iir:
+            xh = np.concatenate((xh, xb))[-order:]
+            yh = np.concatenate((yh, yb.astype(np.int64)))[-order:]
+
+        start, stop = pos * m, min((pos + k) * m, x.shape[0])
+        y[start:stop] = _phase_signal(yb, stop - start)
+        pos += k
+    return y
+
+
+# Filter with the comb filter of b, a in the given precision
+def comb_lfilter(b, a, factor, x, precision='float64'):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    x:            array, input samples along axis 0 - int16 for 'q15', converted to float for the others
+    precision:    string, 'float64', 'float32' or 'q15'
+
+    Returns
+    ---------
+    y:            array, filtered samples in the dtype of the precision
+    """
+
+    if precision == 'q15':
+        return comb_lfilter_q15(*q15_coefficients(b, a), factor, x)
+    elif precision in ('float64', 'float32'):
+        return CombDelayLine(b, a, factor, dtype=precision).process(x)
+    raise ValueError("unknown precision '%s', use one of %s" % (precision, ', '.join(PRECISIONS)))
+
+
+# Largest distance from a root in r to its nearest root in r_q - in chunks, comb filters have many roots
+def _root_shift(r, r_q, chunk=512):
+    if r.shape[0] == 0 or r_q.shape[0] == 0:
+        return 0.0
+    return max(np.min(np.abs(r[i:i + chunk, None] - r_q[None, :]), axis=1).max()
+               for i in range(0, r.shape[0], chunk))
+
+
+# How far the comb filter in reduced precision is from the float64 one
+def precision_report(b, a, factor, precision, worN=512, fs=2 * np.pi, margin=1e-3):
+    """
+    The comb poles have radius |p|^(1/M), so a larger factor pushes them towards the unit circle
+    even if the prototype is far from it - a warning is raised if a quantized comb pole lies
+    within margin of the unit circle or outside of it.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    precision:    string, 'float64', 'float32' or 'q15'
+    worN:         int, number of frequencies
+    fs:           double, sampling frequency
+    margin:       double, distance to the unit circle that triggers the warning
+
+    Returns
+    ---------
+    report:       dict, max_error (|H - H_q|), max_mag_error_db (where |H| > -60 dB), max_phase_error (rad),
+                  zero_shift, pole_shift (largest root displacement), pole_radius, pole_radius_q
+    """
+
+    b, a = _normalized(b, a)
+    b_q, a_q = quantize(b, a, precision)
+
+    _, h = CombResponse(b, a, worN, fs).freqz(factor)
+    _, h_q = CombResponse(b_q, a_q, worN, fs).freqz(factor)
+    passband = np.abs(h) > 1e-3
+    mag_db = 20 * np.log10(np.abs(h[passband]))
+    mag_db_q = 20 * np.log10(np.maximum(np.abs(h_q[passband]), 1e-300))
+    phase_error = np.angle(h_q[passband] * np.conj(h[passband]))
+
+    # The kaiser edge taps of the FIR filters are tiny or round to 0, tf2zpk warns about them
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', BadCoefficients)
+        z, p, _ = comb_zpk(*tf2zpk(b, a), factor)
+        z_q, p_q, _ = comb_zpk(*tf2zpk(b_q, a_q), factor)
+    radius = np.max(np.abs(p)) if p.shape[0] else 0.0
+    radius_q = np.max(np.abs(p_q)) if p_q.shape[0] else 0.0
+
+    if radius_q >= 1:
+        warnings.warn("%s comb filter with factor %d is unstable, quantized pole radius %.6f"
+                      % (precision, factor, radius_q), RuntimeWarning)
+    elif radius_q > 1 - margin:
+        warnings.warn("%s comb filter with factor %d has a quantized pole %.2e from the unit circle"
+                      % (precision, factor, 1 - radius_q), RuntimeWarning)
+
+    return dict(precision=precision,
+                factor=factor,
+                max_error=float(np.max(np.abs(h - h_q))),
+                max_mag_error_db=float(np.max(np.abs(mag_db_q - mag_db))) if mag_db.shape[0] else 0.0,
+                max_phase_error=float(np.max(np.abs(phase_error))) if phase_error.shape[0] else 0.0,
+                zero_shift=float(_root_shift(z, z_q)),
+                pole_shift=float(_root_shift(p, p_q)),
+                pole_radius=float(radius),
+                pole_radius_q=float(radius_q))
@@ -0,0 +1,141 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Response evaluation for long comb filters - zero padded FFT and chirp-z zoom onto narrow teeth
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : Rabiner, Schafer, Rader - The Chirp z-Transform Algorithm, 1969
+
+import numpy as np
+
+from scipy.signal import czt
+
+from combfilter import _prototype, _fft_response
+
+
+# Response of a FIR comb filter on the zero padded rFFT grid - nfft can be as dense as needed
+def comb_rfft(b, factor, nfft=4096, fs=2 * np.pi):
+    """
+    The prototype is transformed once with nfft points, the comb filter response at
+    bin k is the prototype bin k*M modulo nfft, M = factor+1.
+
+    Parameters
+    ----------
+    b:            array[double], FIR filter coefficients of the single section filter
+    factor:       int, repetition factor of the comb filter
+    nfft:         int, FFT length, the result has nfft//2+1 frequencies from 0 to fs/2
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    freq,h:       array[double], array[complex], frequencies and response of the comb filter
+    """
+
+    b, _ = _prototype(b, 1)
+    h_whole = _fft_response(b[None, :], nfft)[0]
+    k = np.arange(nfft // 2 + 1)
+    return k * fs / nfft, h_whole[(k * (factor + 1)) % nfft]
+
+
+# Chirp-z evaluation of a polynomial in z^-1 on n equally spaced frequencies from f_lo to f_hi
+def _czt_band(c, f_lo, f_hi, n, fs):
+    step = (f_hi - f_lo) / (n - 1) if n > 1 else 0.0
+    return czt(c, m=n, w=np.exp(-2j * np.pi * step / fs), a=np.exp(2j * np.pi * f_lo / fs))
+
+
+# Response of a comb filter on a narrow band only - chirp-z transform of the prototype at the frequencies times M
+def comb_zoom(b, a, factor, f_lo, f_hi, n=256, fs=2 * np.pi):
+    """
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    f_lo,f_hi:    double, band to evaluate, end points included
+    n:            int, number of frequencies in the band
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    freq,h:       array[double], array[complex], frequencies and response of the comb filter
+    """
+
+    b, a = _prototype(b, a)
+    m = factor + 1
+    freq = np.linspace(f_lo, f_hi, n)
+
+    # H_comb(f) = H(f*M) - the band is M times wider on the prototype
+    h = _czt_band(b, m * f_lo, m * f_hi, n, fs)
+    if a.shape[0] > 1:
+        h = h / _czt_band(a, m * f_lo, m * f_hi, n, fs)
+    else:
+        h = h / a[0]
+    return freq, h
+
+
+# Centre frequencies of all teeth of the comb filter whose prototype has a notch or peak at f_notch
+def comb_tooth_centres(f_notch, factor, fs):
+    """
+    Parameters
+    ----------
+    f_notch:      double, notch (or peak) frequency of the prototype
+    factor:       int, repetition factor of the comb filter
+    fs:           double, sampling frequency
+
+    Returns
+    ---------
+    centres:      array[double], sorted centre frequencies between 0 and fs/2
+    """
+
+    m = factor + 1
+    k = np.arange(m + 1)
+    centres = np.concatenate(((k * fs + f_notch) / m, (k * fs - f_notch) / m))
+    return np.unique(centres[(centres >= 0) & (centres <= fs / 2)])
+
+
+# Find the exact minimum (notch) or maximum around each centre by zooming in repeatedly
+def refine_extrema(b, a, factor, centres, fs=2 * np.pi, width=None, n=16, iterations=8, find='min'):
+    """
+    Every iteration evaluates n frequencies with the chirp-z transform around the best
+    point so far and shrinks the band to 4 grid steps - the resolution improves by
+    about n/4 per iteration, with n*iterations evaluations per tooth in total.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    centres:      array[double], start frequencies, e.g. from comb_tooth_centres
+    fs:           double, sampling frequency
+    width:        double, width of the first band, default is the tooth spacing fs/(2*M)
+    n:            int, frequencies per iteration
+    iterations:   int, number of zoom steps
+    find:         string, 'min' for notches, 'max' for peaks
+
+    Returns
+    ---------
+    freq,mag_db:  array[double], array[double], frequency and magnitude in dB of each extremum
+    """
+
+    m = factor + 1
+    width = fs / (2 * m) if width is None else width
+    pick = np.argmin if find == 'min' else np.argmax
+
+    freqs, mags = [], []
+    for centre in np.atleast_1d(centres):
+        w = width
+        for _ in range(iterations):
+            lo = max(centre - w / 2, 0.0)
+            hi = min(centre + w / 2, fs / 2)
+            f, h = comb_zoom(b, a, factor, lo, hi, n, fs)
+            mag = 20 * np.log10(np.maximum(np.abs(h), 1e-300))
+            i = pick(mag)
+            centre = f[i]
+            w = 4 * (hi - lo) / (n - 1)
+        freqs.append(centre)
+        mags.append(mag[i])
+
+    return np.array(freqs), np.array(mags)
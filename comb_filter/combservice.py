@@ -0,0 +1,397 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Local HTTP/JSON service for filter designs, comb filters, responses and zeros/poles - batches concurrent requests
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+# Every endpoint takes one JSON object per POST request, e.g.
+#   POST /design    {"type": "iir", "f_0": 1000, "f_1": 4000, "f_s": 10000, "Q": 20, "numtaps": 37}
+#   POST /comb      {"b": [...], "a": [...], "factor": 3}
+#   POST /response  {"b": [...], "a": [...], "factor": 3, "worN": 512, "fs": 10000}
+#   POST /zpk       {"b": [...], "a": [...], "factor": 3}
+#   GET  /metrics   requests, errors, throughput, latency and batch sizes per endpoint
+
+import os
+import time
+import json
+import asyncio
+import argparse
+import numpy as np
+
+from scipy.signal import tf2zpk
+from concurrent.futures import ProcessPoolExecutor
+
+from combfilter import design_filter, combfilter_batch, comb_freqz_batch, comb_zpk, _prototype
+from stagetimer import StageTimer
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+# Largest factor, number of frequencies and FIR length of a request - the work and memory of a batch grow with them
+MAX_FACTOR = 4096
+MAX_WORN = 8192
+MAX_NUMTAPS = 4097
+# Largest request body in bytes
+MAX_BODY = 1 << 20
+
+
+def _encode(obj):
+    return json.dumps(obj).encode()
+
+
+def _error(e):
+    message = 'missing field %s' % e if isinstance(e, KeyError) else str(e) or type(e).__name__
+    return 400, _encode(dict(error=message))
+
+
+# An integer field - 3 and 3.0 are fine, 1.7 or true are not
+def _integer(item, name, default):
+    value = item.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value != int(value):
+        raise ValueError('%s must be an integer' % name)
+    return int(value)
+
+
+# Error of a whole group - bad parameters are the client's fault, anything else is ours
+def _group_error(e):
+    if isinstance(e, (KeyError, TypeError, ValueError)):
+        return _error(e)
+    return 500, _encode(dict(error=repr(e)))
+
+
+# Sort the requests by prototype and extra parameters, every group is one vectorized call
+def _prototype_groups(items, extra=()):
+    """
+    Parameters
+    ----------
+    items:        list[dict], request bodies with b, a and factor
+    extra:        tuple of (name, default), further parameters that must match within a group
+
+    Returns
+    ---------
+    groups:       dict, key -> (b, a, params, request indices, factors)
+    results:      list, an error response for the requests that could not be parsed, None for the rest
+    """
+
+    groups = dict()
+    results = [None] * len(items)
+    for i, item in enumerate(items):
+        try:
+            b, a = _prototype(item['b'], item.get('a', 1))
+            factor = _integer(item, 'factor', 0)
+            params = tuple(_integer(item, name, default) if isinstance(default, int) else float(item.get(name, default))
+                           for name, default in extra)
+            if b.ndim != 1 or a.ndim != 1 or b.size == 0 or a.size == 0 or a[0] == 0:
+                raise ValueError('b and a must be flat, non empty lists with a[0] != 0')
+            if not (np.all(np.isfinite(b)) and np.all(np.isfinite(a))):
+                raise ValueError('b and a must be finite')
+            if not 0 <= factor <= MAX_FACTOR:
+                raise ValueError('factor must be in 0 ... %d' % MAX_FACTOR)
+        except (KeyError, TypeError, ValueError) as e:
+            results[i] = _error(e)
+            continue
+
+        key = (b.tobytes(), a.tobytes()) + params
+        group = groups.setdefault(key, (b, a, params, [], []))
+        group[3].append(i)
+        group[4].append(factor)
+    return groups, results
+
+
+# The batch functions run in the worker processes - a list of request bodies in, a list of (status, json bytes) out
+# A group that fails only fails its own requests, the other groups of the batch are answered
+def _design_batch(items):
+    results = []
+    for item in items:
+        try:
+            numtaps = _integer(item, 'numtaps', 37)
+            if not 1 <= numtaps <= MAX_NUMTAPS:
+                raise ValueError('numtaps must be in 1 ... %d' % MAX_NUMTAPS)
+            b, a = design_filter(item['type'], float(item['f_0']), float(item.get('f_1', 0)), float(item['f_s']),
+                                 Q=float(item.get('Q', 1)), numtaps=numtaps)
+        except (KeyError, TypeError, ValueError) as e:
+            results.append(_error(e))
+            continue
+        results.append((200, _encode(dict(b=np.atleast_1d(b).tolist(), a=np.atleast_1d(a).tolist()))))
+    return results
+
+
+def _comb_batch(items):
+    groups, results = _prototype_groups(items)
+    for b, a, _, index, factors in groups.values():
+        try:
+            (b_values, b_offsets), (a_values, a_offsets) = combfilter_batch(b, a, factors, output='ragged')
+            for j, i in enumerate(index):
+                results[i] = (200, _encode(dict(b=b_values[b_offsets[j]:b_offsets[j + 1]].tolist(),
+                                                a=a_values[a_offsets[j]:a_offsets[j + 1]].tolist())))
+        except Exception as e:
+            for i in index:
+                results[i] = _group_error(e)
+    return results
+
+
+def _response_batch(items):
+    groups, results = _prototype_groups(items, extra=(('worN', 512), ('fs', 2 * np.pi)))
+    for b, a, (worN, fs), index, factors in groups.values():
+        try:
+            if not 0 < worN <= MAX_WORN:
+                raise ValueError('worN must be in 1 ... %d' % MAX_WORN)
+            if not (np.isfinite(fs) and fs > 0):
+                raise ValueError('fs must be positive')
+            freq, h = comb_freqz_batch(b, a, factors, worN, fs)
+            mag_db = 20 * np.log10(np.maximum(np.abs(h[0]), 1e-15))
+            phase = np.unwrap(np.angle(h[0]), axis=1)
+            freq = freq.tolist()
+            for j, i in enumerate(index):
+                results[i] = (200, _encode(dict(freq=freq, mag_db=mag_db[j].tolist(), phase=phase[j].tolist())))
+        except Exception as e:
+            for i in index:
+                results[i] = _group_error(e)
+    return results
+
+
+def _zpk_batch(items):
+    groups, results = _prototype_groups(items)
+    for b, a, _, index, factors in groups.values():
+        try:
+            z, p, k = tf2zpk(b, a)
+            for factor, i in zip(factors, index):
+                z_c, p_c, _ = comb_zpk(z, p, k, factor)
+                results[i] = (200, _encode(dict(z=[z_c.real.tolist(), z_c.imag.tolist()],
+                                                p=[p_c.real.tolist(), p_c.imag.tolist()], k=float(k))))
+        except Exception as e:
+            for i in index:
+                results[i] = _group_error(e)
+    return results
+
+
+ENDPOINTS = {'design': _design_batch, 'comb': _comb_batch, 'response': _response_batch, 'zpk': _zpk_batch}
+
+
+# Top level, so the process pool can pickle it
+def run_batch(endpoint, items):
+    return ENDPOINTS[endpoint](items)
+
+
+# Collects the requests of one endpoint for a short window and hands them to the pool as one batch
+class Batcher(object):
+    """
+    Parameters
+    ----------
+    name:         string, endpoint name, one of ENDPOINTS
+    pool:         concurrent.futures executor that runs the batches
+    slots:        asyncio.Semaphore, batches in the pool at once - while all are taken the requests queue up
+                  and the next batch takes all of them
+    window:       double, seconds to wait for more requests after the first one of a batch
+    max_batch:    int, a batch is sent at once when it has this many requests
+    """
+
+    def __init__(self, name, pool, slots, window=0.002, max_batch=256):
+        self.name = name
+        self.pool = pool
+        self.slots = slots
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.batched = 0
+        self.running = set()
+        self.task = asyncio.get_running_loop().create_task(self.collect())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Wait for a free worker, everything that arrived meanwhile goes into this batch
+            await self.slots.acquire()
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # Do not wait for the pool, the next batch is collected meanwhile
+            task = loop.create_task(self.dispatch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def dispatch(self, batch):
+        self.batches += 1
+        self.batched += len(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, run_batch, self.name, [item for item, _ in batch])
+        except Exception as e:
+            results = [(500, _encode(dict(error=repr(e))))] * len(batch)
+        finally:
+            self.slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# HTTP/1.1 with keep-alive on a TCP or Unix socket, one Batcher per endpoint
+class CombService(object):
+    """
+    Parameters
+    ----------
+    workers:      int, worker processes, default is the number of cpu cores
+    window:       double, batch collection window in seconds
+    max_batch:    int, largest batch per endpoint
+    """
+
+    def __init__(self, workers=None, window=0.002, max_batch=256):
+        self.workers = workers
+        self.window = window
+        self.max_batch = max_batch
+        self.timer = StageTimer(window=1000, trace_size=0)
+        self.requests = dict.fromkeys(ENDPOINTS, 0)
+        self.errors = dict.fromkeys(ENDPOINTS, 0)
+        self.batchers = dict()
+        self.pool = None
+        self.started = time.perf_counter()
+
+    async def start(self, host='127.0.0.1', port=8765, unix=None):
+        workers = self.workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        slots = asyncio.Semaphore(workers)
+        self.batchers = {name: Batcher(name, self.pool, slots, self.window, self.max_batch) for name in ENDPOINTS}
+        self.started = time.perf_counter()
+        if unix:
+            return await asyncio.start_unix_server(self.handle, path=unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        for batcher in self.batchers.values():
+            batcher.task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def metrics(self):
+        """
+        Returns
+        ---------
+        metrics:      dict, per endpoint the number of requests and errors, requests per second since the start,
+                      p50/p95/max latency in ms over the last 1000 requests and the mean batch size
+        """
+
+        elapsed = time.perf_counter() - self.started
+        latency = self.timer.stats()
+        metrics = dict(uptime=elapsed)
+        for name, batcher in self.batchers.items():
+            stats = latency.get(name)
+            metrics[name] = dict(requests=self.requests[name], errors=self.errors[name],
+                                 throughput=self.requests[name] / elapsed,
+                                 batches=batcher.batches,
+                                 mean_batch=batcher.batched / batcher.batches if batcher.batches else 0.0)
+            if stats is not None:
+                metrics[name].update(p50_ms=stats['p50'] * 1e3, p95_ms=stats['p95'] * 1e3, max_ms=stats['max'] * 1e3)
+        return metrics
+
+    async def route(self, method, path, body):
+        name = path.strip('/')
+        if name == 'metrics':
+            return (200, _encode(self.metrics())) if method == 'GET' else (405, _encode(dict(error='use GET')))
+        if name not in ENDPOINTS:
+            return 404, _encode(dict(error='unknown endpoint /%s, use one of /%s' % (name, ', /'.join(ENDPOINTS))))
+        if method != 'POST':
+            return 405, _encode(dict(error='use POST'))
+
+        start = time.perf_counter()
+        try:
+            item = json.loads(body)
+            if not isinstance(item, dict):
+                raise ValueError('the body must be one JSON object')
+        except ValueError as e:
+            status, payload = _error(e)
+        else:
+            status, payload = await self.batchers[name].submit(item)
+        self.timer.record(name, start, time.perf_counter() - start)
+        self.requests[name] += 1
+        self.errors[name] += status != 200
+        return status, payload
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path = line.decode('latin-1').split()[:2]
+                headers = dict()
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                # A body that is too large is not read, so the connection can not be used any further
+                length = int(headers.get('content-length', 0))
+                if not 0 <= length <= MAX_BODY:
+                    payload = _encode(dict(error='the body must have 0 ... %d bytes' % MAX_BODY))
+                    writer.write(b'HTTP/1.1 413 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                                 b'Connection: close\r\n\r\n' % (REASONS[413].encode(), len(payload)) + payload)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length)
+
+                status, payload = await self.route(method, path, body)
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                             % (status, REASONS.get(status, 'Error').encode(), len(payload)) + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    service = CombService(args.workers, args.window / 1e3, args.max_batch)
+    server = await service.start(args.host, args.port, args.unix)
+    print('serving on %s' % (args.unix or 'http://%s:%d' % (args.host, args.port)))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve comb filter designs, responses and zeros/poles over HTTP/JSON.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port')
+    parser.add_argument('--unix', default=None, help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, default is the number of cpu cores')
+    parser.add_argument('--window', type=float, default=2, help='batch collection window [ms]')
+    parser.add_argument('--max-batch', type=int, default=256, help='largest batch per endpoint')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
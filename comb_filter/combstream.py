@@ -0,0 +1,113 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Block streaming comb filter for audio that arrives in chunks
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import numpy as np
+
+from combfilter import CombDelayLine
+
+
+# Filters a stream of audio blocks with a comb filter, the filter state carries over between blocks
+class CombStream(object):
+    """
+    Blocks can have any length and any number of channels (axis 1). When the filter
+    or the factor changes, the new filter fades in over fade samples from what is
+    currently audible - if a fade is still running that is the mix of the fading
+    filters, each of them keeps running until the newest one is fully faded in, so
+    fast changes, e.g. a slider drag, do not click either.
+    Output buffers are allocated once per filter and only grow if a longer block arrives,
+    the returned array is a view into them and is valid until the next call.
+    The filtering itself still allocates per block - lfilter returns new arrays for the
+    output and the filter state, see CombDelayLine - so this is not allocation free.
+
+    Parameters
+    ----------
+    b,a:          array[double], filter coefficients of an single section filter
+    factor:       int, repetition factor of the comb filter
+    blocksize:    int, expected block length, used to preallocate the buffers
+    channels:     int, number of channels, 0 for a 1-D mono stream
+    fade:         int, length of the crossfade in samples after a filter change
+    """
+
+    def __init__(self, b, a, factor, blocksize=1024, channels=0, fade=1024):
+        self.fade = fade
+        self.ramp = (np.arange(fade) + 1.0) / fade
+        self.channels = channels
+        self.blocksize = blocksize
+        # Oldest to newest: [line, samples faded in, output buffer] - the oldest one is fully faded in
+        self.lines = [[CombDelayLine(b, a, factor), fade, self._buffer()]]
+
+    def _buffer(self):
+        return np.zeros((self.blocksize,) + ((self.channels,) if self.channels else ()))
+
+    @property
+    def line(self):
+        return self.lines[-1][0]
+
+    @property
+    def factor(self):
+        return self.line.factor
+
+    # Change coefficients and/or factor - takes effect with the next block
+    def set_filter(self, b=None, a=None, factor=None):
+        b = self.line.b if b is None else b
+        a = self.line.a if a is None else a
+        factor = self.line.factor if factor is None else factor
+
+        # A filter that has not started to fade in yet is not audible, it is simply replaced
+        if len(self.lines) > 1 and self.lines[-1][1] == 0:
+            self.lines.pop()
+        self.lines.append([CombDelayLine(b, a, factor), 0, self._buffer()])
+
+    def reset(self):
+        self.lines = [[self.line, self.fade, self.lines[-1][2]]]
+        self.line.reset()
+
+    def process(self, x):
+        """
+        Parameters
+        ----------
+        x:            array[double], block of samples, shape (n,) or (n, channels)
+
+        Returns
+        ---------
+        y:            array[double], filtered block, view into the output buffer
+        """
+
+        x = np.asarray(x, dtype=float)
+        n = x.shape[0]
+        if n > self.blocksize:
+            self.blocksize = n
+            for entry in self.lines:
+                entry[2] = self._buffer()
+
+        # Every filter fades in over the mix of the ones before it
+        mix = None
+        for entry in self.lines:
+            line, pos, out = entry
+            y = line.process(x, out=out[:n])
+            k = min(self.fade - pos, n)
+            if mix is not None and k > 0:
+                g = self.ramp[pos:pos + k]
+                if y.ndim > 1:
+                    g = g[:, None]
+                y[:k] -= mix[:k]
+                y[:k] *= g
+                y[:k] += mix[:k]
+            entry[1] = pos + k
+            mix = y
+
+        # Filters before the newest fully faded in one are no longer heard
+        done = max(i for i, entry in enumerate(self.lines) if entry[1] >= self.fade)
+        del self.lines[:done]
+
+        return mix
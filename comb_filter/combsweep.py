@@ -0,0 +1,183 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Headless parameter sweep - renders the eight plots of every design to PNG and writes a metrics table
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import os
+import csv
+import itertools
+import argparse
+import numpy as np
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
+
+from combfilter import design_filter
+from combcache import cached_response, cached_zpk
+from combplots import create_figure, plot_pz
+from combresponse import comb_tooth_centres, refine_extrema
+
+
+# Width of the contiguous region below level_db around index i of the magnitude mag_db
+def _band_width(freq, mag_db, i, level_db):
+    below = mag_db < level_db
+    left = i
+    while left > 0 and below[left - 1]:
+        left -= 1
+    right = i
+    while right < below.shape[0] - 1 and below[right + 1]:
+        right += 1
+    return freq[right] - freq[left]
+
+
+# Numeric summary of one design
+def design_metrics(f_0, f_1, f_s, numtaps, factor, iir, fir, iir_ba):
+    """
+    Parameters
+    ----------
+    f_0,f_1:      double, FIR stop band edges, f_0 is the IIR notch frequency
+    f_s:          double, sampling frequency
+    numtaps:      int, length of the FIR filter
+    factor:       int, repetition factor of the comb filter
+    iir,fir:      CombResponse, responses of the prototypes
+    iir_ba:       tuple, coefficients b, a of the IIR prototype, the notches are measured by zooming in on them
+
+    Returns
+    ---------
+    metrics:      dict, notch depth and tooth width of the IIR comb, pass band ripple, stop band attenuation
+                  and tooth width of the FIR band stop comb
+    """
+
+    m = factor + 1
+    freq, h_iir = iir.freqz(factor)
+    _, h_fir = fir.freqz(factor)
+    iir_db = 20 * np.log10(np.maximum(np.abs(h_iir), 1e-15))
+    fir_db = 20 * np.log10(np.maximum(np.abs(h_fir), 1e-15))
+
+    # Every tooth is the prototype squeezed by M - widths are measured on the prototype and scaled
+    _, h_iir_0 = iir.freqz(0)
+    _, h_fir_0 = fir.freqz(0)
+    iir_db_0 = 20 * np.log10(np.maximum(np.abs(h_iir_0), 1e-15))
+    fir_db_0 = 20 * np.log10(np.maximum(np.abs(h_fir_0), 1e-15))
+
+    # firwin with [f_0, f_1] is a band stop - pass and stop band of the comb without the kaiser transition bands
+    transition = 2.5 * f_s / numtaps
+    # The comb repeats the prototype, so each frequency is folded back onto the prototype frequency it shows
+    folded = np.mod(freq * m, f_s)
+    folded = np.minimum(folded, f_s - folded)
+    stopband = (folded >= f_0 + transition) & (folded <= f_1 - transition)
+    passband = (folded <= f_0 - transition) | (folded >= f_1 + transition)
+
+    # The notches are narrower than the grid at high factors - zoom in on every tooth instead
+    _, notch_db = refine_extrema(*iir_ba, factor, comb_tooth_centres(f_0, factor, f_s), f_s)
+
+    return dict(
+        iir_notch_depth_db=float(min(np.min(iir_db), np.min(notch_db))),
+        iir_tooth_width_hz=float(_band_width(freq, iir_db_0, np.argmin(iir_db_0), -3.0) / m),
+        fir_passband_ripple_db=float(np.ptp(fir_db[passband])) if passband.any() else np.nan,
+        fir_stopband_atten_db=float(-np.max(fir_db[stopband])) if stopband.any() else np.nan,
+        fir_tooth_width_hz=float(_band_width(freq, fir_db_0, np.argmin(fir_db_0), -3.0) / m),
+    )
+
+
+# Design, measure and optionally render one configuration - runs in a worker process
+def render_config(config, f_s, outdir, worN):
+    """
+    Parameters
+    ----------
+    config:       tuple, (f_0, f_1, Q, numtaps, factor)
+    f_s:          double, sampling frequency
+    outdir:       string, directory for the PNG, None for no image
+    worN:         int, number of frequencies of the responses
+
+    Returns
+    ---------
+    row:          dict, the configuration, its metrics and the image file
+    """
+
+    f_0, f_1, Q, numtaps, factor = config
+    row = dict(f_0=f_0, f_1=f_1, Q=Q, numtaps=numtaps, factor=factor)
+
+    filters = dict(iir=design_filter('iir', f_0, f_1, f_s, Q), fir=design_filter('fir', f_0, f_1, f_s, Q, numtaps))
+    responses = {type: cached_response(b, a, f_s, worN) for type, (b, a) in filters.items()}
+    row.update(design_metrics(f_0, f_1, f_s, numtaps, factor, responses['iir'], responses['fir'], filters['iir']))
+
+    if outdir:
+        fig, axes = create_figure(16, 10, 100)
+        FigureCanvasAgg(fig)
+
+        # Same panels as MainWindow - IIR on the left, FIR on the right
+        for type, (ax_proto, ax_freq, ax_phase, ax_pz) in (('iir', axes[0:4]), ('fir', axes[4:8])):
+            freq, h_0 = responses[type].freqz(0)
+            _, h = responses[type].freqz(factor)
+            z, p, k = cached_zpk(*filters[type], factor)
+
+            ax_proto.plot(freq, 20 * np.log10(np.maximum(np.abs(h_0), 1e-15)), 'r')
+            ax_freq.plot(freq, 20 * np.log10(np.maximum(np.abs(h), 1e-15)), 'g')
+            ax_phase.plot(freq, np.degrees(np.unwrap(np.angle(h))), 'g')
+            plot_pz(ax_pz, z, p, '%s Comb Filter - PZ Map' % type.upper())
+
+        fig.suptitle('f_0=%g Hz  f_1=%g Hz  Q=%g  numtaps=%d  factor=%d' % config)
+        row['image'] = os.path.join(outdir, 'comb_f0-%g_f1-%g_Q-%g_taps-%d_factor-%d.png' % config)
+        fig.savefig(row['image'])
+
+    return row
+
+
+# Write the rows as CSV, or as Parquet if the file name ends with .parquet (needs pandas)
+def write_table(rows, path):
+    if path.endswith('.parquet'):
+        import pandas
+        pandas.DataFrame(rows).to_parquet(path)
+        return
+
+    with open(path, 'w', newline='') as fid:
+        writer = csv.DictWriter(fid, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ---------------------------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render comb filter designs over a parameter grid without a display.')
+    parser.add_argument('--f0', type=float, nargs='+', default=[1000], help='FIR lower stop band edges / IIR notch frequencies [Hz]')
+    parser.add_argument('--f1', type=float, nargs='+', default=[4000], help='FIR upper stop band edges [Hz]')
+    parser.add_argument('--Q', type=float, nargs='+', default=[20], help='quality factors of the IIR notch')
+    parser.add_argument('--numtaps', type=int, nargs='+', default=[37], help='lengths of the FIR filter')
+    parser.add_argument('--factor', type=int, nargs='+', default=[0, 1, 2, 5, 10], help='repetition factors')
+    parser.add_argument('--fs', type=float, default=10000, help='sampling frequency [Hz]')
+    parser.add_argument('--worN', type=int, default=4096, help='number of frequencies of the responses')
+    parser.add_argument('--outdir', default='sweep', help='directory for the images and the table')
+    parser.add_argument('--table', default='metrics.csv', help='table file name, .csv or .parquet')
+    parser.add_argument('--no-images', action='store_true', help='only write the table')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, default is the number of cpu cores')
+    args = parser.parse_args(argv)
+
+    # Only valid bands below the Nyquist frequency
+    grid = [config for config in itertools.product(args.f0, args.f1, args.Q, args.numtaps, args.factor)
+            if 0 < config[0] < config[1] < args.fs / 2]
+
+    os.makedirs(args.outdir, exist_ok=True)
+    imagedir = None if args.no_images else args.outdir
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        rows = list(pool.map(render_config, grid, itertools.repeat(args.fs),
+                             itertools.repeat(imagedir), itertools.repeat(args.worN)))
+
+    if rows:
+        write_table(rows, os.path.join(args.outdir, args.table))
+    print('%d configurations written to %s' % (len(rows), args.outdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Command line tool to apply a comb filter to WAV files - block wise, memory mapped, in parallel
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import os
+import struct
+import argparse
+import numpy as np
+
+from scipy.io import wavfile
+from concurrent.futures import ProcessPoolExecutor
+
+from combfilter import design_filter, CombDelayLine
+
+
+# Write a WAV header for frames x channels samples of dtype - the data itself is written later through a memmap
+def write_wav_header(path, rate, dtype, frames, channels):
+    """
+    Parameters
+    ----------
+    path:         string, output file
+    rate:         int, sampling frequency
+    dtype:        numpy dtype of the samples, uint8, int16, int32, float32 or float64
+    frames:       int, number of samples per channel
+    channels:     int, number of channels
+
+    Returns
+    ---------
+    offset:       int, byte offset of the sample data in the file
+    """
+
+    dtype = np.dtype(dtype)
+    fmt_tag = 3 if dtype.kind == 'f' else 1
+    block_align = channels * dtype.itemsize
+    data_size = frames * block_align
+
+    header = b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, fmt_tag, channels, rate,
+                                    rate * block_align, block_align, dtype.itemsize * 8)
+    header += b'data' + struct.pack('<I', data_size)
+
+    # Size the file once, the workers fill in the samples
+    with open(path, 'wb') as fid:
+        fid.write(header)
+        fid.truncate(len(header) + data_size)
+
+    return len(header)
+
+
+# Filter one channel of one file block by block - runs in a worker process
+def filter_channel(path_in, path_out, offset, channel, args):
+    """
+    Parameters
+    ----------
+    path_in:      string, input WAV file, read memory mapped
+    path_out:     string, output WAV file with header already written
+    offset:       int, byte offset of the sample data in the output file
+    channel:      int, channel to filter, None for a mono file
+    args:         argparse.Namespace, the filter design and block size
+    """
+
+    rate, data = wavfile.read(path_in, mmap=True)
+    out = np.memmap(path_out, dtype=data.dtype, mode='r+', offset=offset, shape=data.shape)
+
+    f_s = args.fs if args.fs else rate
+    b, a = design_filter(args.type, args.f0, args.f1, f_s, args.Q, args.numtaps)
+    line = CombDelayLine(b, a, args.factor)
+
+    # 8 bit WAVs are unsigned with the zero line at 128
+    center = 128.0 if data.dtype == np.uint8 else 0.0
+    if data.dtype.kind in 'iu':
+        limits = np.iinfo(data.dtype)
+
+    select = (slice(None),) if channel is None else (slice(None), channel)
+    block = np.empty(args.blocksize)
+
+    for start in range(0, data.shape[0], args.blocksize):
+        stop = min(start + args.blocksize, data.shape[0])
+        x = block[:stop - start]
+        x[:] = data[start:stop][select]
+        x -= center
+
+        y = line.process(x, out=x)
+        y += center
+
+        # Integer samples are rounded and clipped back into their range
+        if data.dtype.kind in 'iu':
+            np.rint(y, out=y)
+            np.clip(y, limits.min, limits.max, out=y)
+        out[start:stop][select] = y
+
+    out.flush()
+    del out
+
+
+# Filter all files, one job per file and channel
+def process_files(paths, args):
+    jobs = []
+    for path_in in paths:
+        rate, data = wavfile.read(path_in, mmap=True)
+        channels = 1 if data.ndim == 1 else data.shape[1]
+        name, ext = os.path.splitext(os.path.basename(path_in))
+        path_out = os.path.join(args.outdir or os.path.dirname(path_in), name + args.suffix + ext)
+
+        offset = write_wav_header(path_out, rate, data.dtype, data.shape[0], channels)
+        if data.ndim == 1:
+            jobs.append((path_in, path_out, offset, None, args))
+        else:
+            jobs.extend((path_in, path_out, offset, ch, args) for ch in range(channels))
+        del data
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(filter_channel, *job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            future.result()
+            print('%s - channel %s done' % (job[1], 0 if job[3] is None else job[3]))
+
+
+# ---------------------------------------------------------------------------------------------
+# MAIN
+# ---------------------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply a FIR or IIR comb filter to WAV files.')
+    parser.add_argument('files', nargs='+', help='input WAV files')
+    parser.add_argument('--type', choices=['fir', 'iir'], default='iir', help='prototype filter type')
+    parser.add_argument('--f0', type=float, default=2500, help='FIR lower band edge / IIR notch frequency [Hz]')
+    parser.add_argument('--f1', type=float, default=4000, help='FIR upper band edge [Hz]')
+    parser.add_argument('--fs', type=float, default=None, help='design sampling frequency [Hz], default is the rate of each file')
+    parser.add_argument('--Q', type=float, default=20, help='quality factor of the IIR notch')
+    parser.add_argument('--numtaps', type=int, default=37, help='length of the FIR filter')
+    parser.add_argument('--factor', type=int, default=1, help='repetition factor of the comb filter')
+    parser.add_argument('--blocksize', type=int, default=65536, help='samples per block')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, default is the number of cpu cores')
+    parser.add_argument('--outdir', default=None, help='output directory, default is next to the input')
+    parser.add_argument('--suffix', default='_comb', help='appended to the output file names')
+    args = parser.parse_args(argv)
+
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+    process_files(args.files, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#  ______     ______     __    __     ______           ______   __     __         ______   ______     ______    
+# /\  ___\   /\  __ \   /\ "-./  \   /\  == \         /\  ___\ /\ \   /\ \       /\__  _\ /\  ___\   /\  == \   
+# \ \ \____  \ \ \/\ \  \ \ \-./\ \  \ \  __<         \ \  __\ \ \ \  \ \ \____  \/_/\ \/ \ \  __\   \ \  __<   
+#  \ \_____\  \ \_____\  \ \_\ \ \_\  \ \_____\        \ \_\    \ \_\  \ \_____\    \ \_\  \ \_____\  \ \_\ \_\ 
+#   \/_____/   \/_____/   \/_/  \/_/   \/_____/         \/_/     \/_/   \/_____/     \/_/   \/_____/   \/_/ /_/ 
+#                                                                                                               
+# Project       : Comb Filter - turn an arbitrary single section filter into a comb filter and visualization with a GUI
+# File Purpose  : Opt-in timing of the stages of the GUI update - rolling percentiles and a trace file
+# Course        : Digital Signal Processing 2 - Salzburg University Of Applied Sciences
+# Author        : Armin Niedermueller
+# Date          : 17.04.2021
+# Literature    : none
+
+import os
+import json
+import time
+import threading
+import numpy as np
+
+from collections import deque
+from contextlib import contextmanager
+
+
+# Records how long each named stage takes - keeps the last window durations per stage and a trace of all events
+class StageTimer(object):
+    """
+    Parameters
+    ----------
+    enabled:      bool, a disabled timer records nothing
+    window:       int, number of durations per stage used for the percentiles
+    trace_size:   int, number of events kept for the trace file
+    """
+
+    def __init__(self, enabled=True, window=200, trace_size=100000):
+        self.enabled = enabled
+        self.window = window
+        self.durations = dict()
+        self.trace = deque(maxlen=trace_size)
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    # Time the code inside the with block as stage name
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def record(self, name, start, duration):
+        with self.lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen=self.window)
+            self.durations[name].append(duration)
+            self.trace.append((name, start - self.origin, duration, threading.get_ident()))
+
+    def stats(self):
+        """
+        Returns
+        ---------
+        stats:        dict, per stage the p50, p95 and max duration in seconds and the number of samples
+        """
+
+        with self.lock:
+            durations = {name: np.array(d) for name, d in self.durations.items()}
+        return {name: dict(p50=np.percentile(d, 50), p95=np.percentile(d, 95), max=np.max(d), count=d.shape[0])
+                for name, d in durations.items()}
+
+    # One line readout - stage p50/p95/max in milliseconds
+    def summary(self):
+        return '  |  '.join('%s %.1f/%.1f/%.1f ms' % (name, s['p50'] * 1e3, s['p95'] * 1e3, s['max'] * 1e3)
+                            for name, s in self.stats().items())
+
+    # Write the trace in the Chrome trace event format - opens in chrome://tracing or Perfetto
+    def dump(self, path):
+        with self.lock:
+            trace = list(self.trace)
+        events = [dict(name=name, ph='X', ts=start * 1e6, dur=duration * 1e6, pid=os.getpid(), tid=tid)
+                  for name, start, duration, tid in trace]
+        with open(path, 'w') as fid:
+            json.dump(dict(traceEvents=events, stats=self.stats()), fid)
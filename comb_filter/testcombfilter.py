@@ -11,25 +11,34 @@
 # Date          : 17.04.2021
 # Literature    : none
 
+import time
+start_time = time.perf_counter()
+
+import os
 import sys
-import pip
-import random
+import argparse
+import itertools
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
+# The backend has to be chosen before its module is imported
 import matplotlib
-from matplotlib.figure import Figure
-from matplotlib import patches
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT as NavigationToolbar
 matplotlib.use('Qt5Agg')
+from matplotlib import patches
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 
-from combfilter import *
-from scipy import signal
-from scipy.ndimage.interpolation import shift
+from stagetimer import StageTimer
+from combplots import create_figure
+from combmonitor import SpectrogramMonitor, SquareSource, NoiseSource, WavSource
 
-from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtWidgets import (QWidget, QGridLayout,QPushButton, QApplication, QSlider, QCheckBox)
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtWidgets import (QWidget, QGridLayout, QSlider, QCheckBox)
 from PyQt5.QtCore import Qt
 
+# SciPy (combfilter, combmodel) takes most of the start up time - it is imported by loadFilters
+# in the background once the window is visible, see addFilter
+
 
 # TODOs
 # user can design a FIR filter with sliders  / knobs
@@ -43,105 +52,138 @@ from PyQt5.QtCore import Qt
 # --------------------------------------------------------------------------------------------- 
 
 
-# Saves a Signal and its parameters
-class MySignal(object):
-    x = None
-    y = None
-    color = ''
-    f_s = 0
-    length = 0
-    a = 0
-    b = 0
+# Class that plots our functions
+class MplCanvas(FigureCanvasQTAgg):
 
-    def __init__(self, y, x, color, f_s, b=None, a=None, length=None):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.f_s = f_s
-        self.length = length
-        self.a = a
-        self.b = b
 
+    # Layout - 4 Rows, one Column per panel
 
+    def __init__(self, parent=None, width=5, height=4, dpi=100, panels=('IIR', 'FIR')):
 
-# Class that plots our functions
-class MplCanvas(FigureCanvasQTAgg):
+        # Plot with four subplots per panel - prototype response, comb response, comb phase and comb PZ map
+        fig, axes = create_figure(width, height, dpi, panels)
+        self.panels = {name.lower(): axes[4 * i:4 * i + 4] for i, name in enumerate(panels)}
+        for i, ax in enumerate(axes):
+            setattr(self, 'ax%d' % (i + 1), ax)
 
+        super(MplCanvas, self).__init__(fig)
 
-    # Layout - 3 Rows, 2 Colums
+        # Artists that change with the sliders are animated - they are blitted onto a cached background
+        self.animated = dict()
+        self.backgrounds = dict()
+        self.mpl_connect('draw_event', self.onDraw)
 
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        # Stage timing, MainWindow hands in its own timer when profiling is on
+        self.timer = StageTimer(enabled=False)
 
-        # Plot and its title
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        fig.suptitle('Filters - Original Filter | Converted to comb filter')
+        # PZ maps - unit circle, markers and legend are created once, updates only move the markers
+        # Every filter of a panel has its own pair of zeros and poles markers
+        self.pz_lines = dict()
+        for name in panels:
+            self.setupPZMap(self.panels[name.lower()][3], '%s Comb Filter - PZ Map' % name)
 
-        # Format spaces between plots
-        fig.subplots_adjust(left=0.125,
-                  bottom=0.1, 
-                  right=0.9, 
-                  top=0.9, 
-                  wspace=0.2, 
-                  hspace=1)
 
-        # The Plots and their formatting
-        # PLOT 1
-        self.ax1 = fig.add_subplot(421, title='IIR Filter - Frequency Response')
-        self.ax1.set_xlabel('Frequency [Hz]')
-        self.ax1.set_ylabel('Amplitude [dB]')
-        #self.ax1.set_ylim(-2.0,2.0)
-        
-        # PLOT 2
-        self.ax2 = fig.add_subplot(423, title='IIR Comb Filter - Frequency Response')
-        self.ax2.set_xlabel('Frequency [Hz]')
-        self.ax2.set_ylabel('Amplitude [dB]')
-        #self.ax2.set_ylim(-2.0,2.0)
-        
-        # PLOT 3
-        self.ax3 = fig.add_subplot(425, title='IIR Comb Filter - Phase Response')
-        self.ax3.set_xlabel('Frequency [Hz]')
-        self.ax3.set_ylabel('Phase [°]')
-        #self.ax3.set_ylim(-200.0,200.0)
-        
-        # PLOT 4
-        self.ax4 = fig.add_subplot(427, title='IIR Comb Filter - PZ Map')
-        self.ax4.set_xlabel('Imaginary')
-        self.ax4.set_ylabel('Real')
-        #self.ax4.set_ylim(-2.0,2.0)
-        
-        # PLOT 5
-        self.ax5 = fig.add_subplot(422, title='FIR Filter - Frequency Response')
-        self.ax5.set_xlabel('Frequency [Hz]')
-        self.ax5.set_ylabel('Amplitude [dB]')
-        #self.ax5.set_ylim(-2.0,2.0)
-        
-        # PLOT 6
-        self.ax6 = fig.add_subplot(424, title='FIR Comb Filter - Frequency Response')
-        self.ax6.set_xlabel('Frequency [Hz]')
-        self.ax6.set_ylabel('Amplitude [dB]')
-        #self.ax6.set_ylim(-2.0,2.0)
-        
-        # PLOT 7
-        self.ax7 = fig.add_subplot(426, title='FIR Comb Filter - Phase Response')
-        self.ax7.set_xlabel('Frequency [Hz]')
-        self.ax7.set_ylabel('Phase [°]')
-        #self.ax7.set_ylim(-200.0,200.0)
-        
-        # PLOT 8
-        self.ax8 = fig.add_subplot(428, title='FIR Comb Filter - PZ Map')
-        self.ax8.set_xlabel('Imaginary')
-        self.ax8.set_ylabel('Real')
-        #self.ax8.set_ylim(-2.0,2.0)
-        
+    def setupPZMap(self, ax, title):
+        ax.add_patch(patches.Circle((0, 0), radius=1, fill=False, color='black', ls='dashed'))
+        self.addPZLines(ax)
+        ax.legend(loc=2)
+        ax.set(title=title, xlabel='Real', ylabel='Imaginary', xlim=(-1.1, 1.1), ylim=(-1.1, 1.1))
+
+
+    # Zeros and poles markers for one more filter - only the first pair shows up in the legend
+    def addPZLines(self, ax):
+        first = ax not in self.pz_lines
+        zeros, = ax.plot([], [], 'oy', label='Zeros' if first else '_nolegend_')
+        poles, = ax.plot([], [], 'xb', label='Poles' if first else '_nolegend_')
+        self.addAnimated(ax, zeros)
+        self.addAnimated(ax, poles)
+        self.pz_lines.setdefault(ax, []).append((zeros, poles))
+        return zeros, poles
+
+
+    # Full render of the figure
+    def draw(self):
+        with self.timer.stage('canvas.draw'):
+            super(MplCanvas, self).draw()
+
+
+    def addAnimated(self, ax, artist):
+        artist.set_animated(True)
+        self.animated.setdefault(ax, []).append(artist)
+
+
+    # After every full render - remember each axes without its animated artists, then draw them on top
+    def onDraw(self, event):
+        for ax, artists in self.animated.items():
+            self.backgrounds[ax] = self.copy_from_bbox(ax.bbox)
+            for artist in artists:
+                ax.draw_artist(artist)
 
-        super(MplCanvas, self).__init__(fig)
+
+    # Redraw only the animated artists of the given axes, falls back to a full render if there is no background yet
+    def blitAxes(self, axes):
+        if any(ax not in self.backgrounds for ax in axes):
+            self.draw_idle()
+            return
+
+        for ax in axes:
+            with self.timer.stage('blit'):
+                self.restore_region(self.backgrounds[ax])
+                for artist in self.animated[ax]:
+                    ax.draw_artist(artist)
+                self.blit(ax.bbox)
+
+
+    # Grow the y range if the data leaves it - returns True if the axes changed and needs a full render
+    def growYLimits(self, ax, y):
+        y = y[np.isfinite(y)]
+        if y.shape[0] == 0:
+            return False
+
+        low, high = ax.get_ylim()
+        y_min, y_max = np.min(y), np.max(y)
+        if y_min >= low and y_max <= high:
+            return False
+
+        margin = 0.05 * (max(y_max, high) - min(y_min, low))
+        ax.set_ylim(min(y_min, low) - margin, max(y_max, high) + margin)
+        return True
+
+
+    # Fit the PZ map around the unit circle and all roots - only grows, or shrinks when far too large
+    def fitPZLimits(self, ax, z, p):
+        roots = np.concatenate((np.asarray(z), np.asarray(p)))
+        extent = 1.0
+        if roots.shape[0] > 0:
+            extent = max(extent, np.max(np.abs(np.concatenate((roots.real, roots.imag)))))
+        extent *= 1.1
+
+        current = ax.get_xlim()[1]
+        if current >= extent and current < 2 * extent:
+            return False
+
+        ax.set(xlim=(-extent, extent), ylim=(-extent, extent))
+        return True
 
 
 # The Main window of our program
 class MainWindow(QWidget):
 
-    def __init__(self):
+    # Posted by the worker thread when a panel update is computed - type, (generation, future)
+    updateReady = QtCore.pyqtSignal(str, object)
+
+    # Posted by the loader thread when SciPy is imported - list of addFilter arguments
+    filtersLoaded = QtCore.pyqtSignal(object)
+
+    def __init__(self, profile=None):
         super().__init__()
+
+        # Opt-in stage timing - argument or environment variable COMBFILTER_PROFILE=1,
+        # COMBFILTER_TRACE=<file> also writes a trace file when the window closes
+        if profile is None:
+            profile = os.environ.get('COMBFILTER_PROFILE', '') not in ('', '0')
+        self.timer = StageTimer(enabled=profile)
+
         self.initUI()
   
     def initUI(self, *args, **kwargs):
@@ -157,6 +199,7 @@ class MainWindow(QWidget):
 
         # Define the Plot with its subplots
         self.canvas = MplCanvas(self, width=5, height=4, dpi=100)
+        self.canvas.timer = self.timer
 
         # Create checkboxes
         self.iir_comb_checkbox = QCheckBox("IIR to IIR-comb")
@@ -190,8 +233,16 @@ class MainWindow(QWidget):
         self.iir_comb_label.setText('Status: INACTIVE')
 
         # Connect the sliders to our plots - if the slider value changes, the plot is updated
-        self.iir_comb_slider.valueChanged[int].connect(self.IIRplotsUpdate)
-        self.fir_comb_slider.valueChanged[int].connect(self.FIRplotsUpdate)
+        # The computation runs on a worker thread, values that pile up while it runs are dropped
+        self.iir_comb_slider.valueChanged[int].connect(lambda value: self.requestUpdate('iir', value))
+        self.fir_comb_slider.valueChanged[int].connect(lambda value: self.requestUpdate('fir', value))
+        self.updateReady.connect(self.onUpdateReady)
+        self.filtersLoaded.connect(self.onFiltersLoaded)
+
+        # Start up times in seconds since the module was loaded
+        self.first_frame_time = None
+        self.ready_time = None
+        self.pending_filters = None
 
         # Layout - 3 Rows, 2 Colums
 
@@ -223,15 +274,58 @@ class MainWindow(QWidget):
         grid_layout.addWidget(self.fir_comb_checkbox, 16,1,1,1)
         grid_layout.addWidget(self.fir_comb_slider, 15,2,2,9)
 
+        #   | Stage timing p50/p95/max - only with profiling                  |
+        self.profile_label = QtWidgets.QLabel()
+        self.profile_label.setVisible(self.timer.enabled)
+        grid_layout.addWidget(self.profile_label, 17,1,1,10)
+
+        # Live spectrogram next to the plots - a source streamed through one of the comb filters
+        # The filters are added to the list as they are loaded, the item data is the filter key
+        self.monitor = SpectrogramMonitor(self)
+        self.monitor_checkbox = QCheckBox("Live spectrogram")
+        self.monitor_checkbox.stateChanged.connect(self.monitorCheckBoxAction)
+        self.monitor_panel = QtWidgets.QComboBox()
+        self.monitor_panel.currentIndexChanged[int].connect(self.monitorPanelAction)
+        self.monitor_source = QtWidgets.QComboBox()
+        self.monitor_source.addItems(['Square wave', 'White noise', 'WAV file ...'])
+        self.monitor_source.activated.connect(lambda index: self.monitorCheckBoxAction(self.monitor_checkbox.checkState()))
+
+        #   | Plots                                  | Input / Output Spectrogram |
+        #   | Sliders                                | Monitor on | Filter        |
+        #   |                                        | Source                     |
+        grid_layout.addWidget(self.monitor, 1,11,12,4)
+        grid_layout.addWidget(self.monitor_checkbox, 13,11,1,1)
+        grid_layout.addWidget(self.monitor_panel, 13,12,1,1)
+        grid_layout.addWidget(self.monitor_source, 14,11,1,2)
+
+        # The latest b, a, factor per filter for the monitor, and the design parameters to design it again
+        # for a source with another sampling frequency
+        self.audio_filters = dict()
+        self.designs = dict()
+
        
-        # A dictionary where our functions are stored
+        # A dictionary where our functions are stored - filter model, line color and plot lines per filter key
+        # A panel ('iir' or 'fir') can hold several filters, they are compared on the same axes
         self.plot_refs = dict()
-        self.signals = dict()
+        self.filters = dict()
+        self.colors = dict()
+        self.panel_filters = {'iir': [], 'fir': []}
+        self.sliders = {'iir': self.iir_comb_slider, 'fir': self.fir_comb_slider}
 
         # Initial Values for checkboxes
         self.activateIIRCombFilter = False
         self.activateFIRCombFilter = False
 
+        # Worker thread for slider updates, the latest queued value per panel and whether a panel is computing
+        # The lock keeps the GUI thread and the worker from changing a filter model at the same time
+        # The generation of a panel counts synchronous draws and checkbox changes, worker results
+        # started before one of them are outdated and dropped
+        self.compute_lock = threading.Lock()
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.pending_updates = dict()
+        self.busy = {'iir': False, 'fir': False}
+        self.generation = {'iir': 0, 'fir': 0}
+
         self.show()
 
 
@@ -239,10 +333,12 @@ class MainWindow(QWidget):
     def iirCheckBoxAction(self, state):
         if (Qt.Checked == state):
             # activate upsampling
+            self.generation['iir'] += 1
             self.activateIIRCombFilter = True
             self.iir_comb_label.setText('Status: ACTIVE')
         else: 
             # deactivate upsampling
+            self.generation['iir'] += 1
             self.activateIIRCombFilter = False
             self.iir_comb_label.setText('Status: INACTIVE')
             self.IIRplotsUpdate(1)
@@ -252,185 +348,372 @@ class MainWindow(QWidget):
     def firCheckBoxAction(self, state):
         if (Qt.Checked == state):
             # activate downsampling
+            self.generation['fir'] += 1
             self.activateFIRCombFilter = True
             self.fir_comb_label.setText('Status: ACTIVE')
         else: 
             # deactivate downsampling
+            self.generation['fir'] += 1
             self.activateFIRCombFilter = False
             self.fir_comb_label.setText('Status: INACTIVE')
             self.FIRplotsUpdate(1)
 
 
-    # Add a filter to our plots
-    def addFilter(self, f_0, f_1, f_s, d_t, color, type=None, Q=1):
-        
-        if type == 'fir':
-            numtaps = 37
-    
-            # filter coeffs
-            a = 1
-            b = signal.firwin(numtaps, [f_0, f_1], fs=f_s, window=('kaiser', 8))
-        elif type == 'iir':
-            # filter coeffs
-            b,a = signal.iirnotch(f_0, Q, f_s)
+    # Add a filter to our plots - filters of the same type are shown side by side on the same axes
+    # Adding a key again designs that filter with the new parameters, only it is computed again
+    def addFilter(self, f_0, f_1, f_s, d_t, color, type=None, Q=1, numtaps=37, key=None, label=None):
 
-        else: 
+        if type not in ('fir', 'iir'):
             return 0
-    
-        # Calculate frequency and amplitude
-        freq, h = signal.freqz(b, a, fs=f_s)
-        
-        # Create filter object
-        combedFilter = MySignal(freq, 20 * np.log10(abs(h)), color, f_s, b, a)
 
-        # Get poles and zeros
-        z, p, k = signal.tf2zpk(b, a)
-       
-        # SIGNAL - Add plot reference to our List of plot refs
-        if type == 'fir':
-            self.plot_refs["fir_filter_freq"] = self.canvas.ax5.plot(combedFilter.y,
-                                                combedFilter.x,
-                                                combedFilter.color)
-            self.plot_refs["fir_comb_filter_freq"] = self.canvas.ax6.plot(combedFilter.y,
-                                                combedFilter.x,
-                                                combedFilter.color)
-            self.plot_refs["fir_comb_filter_phase"] = self.canvas.ax7.plot(freq,
-                                                np.unwrap(np.angle(h)) * 180,
-                                                combedFilter.color)
-            self.plot_refs["fir_comb_filter_pz"] = self.canvas.ax8.plot(np.real(z),
-                                                np.imag(z),
-                                                combedFilter.color)
-        elif type == 'iir':
-            self.plot_refs["iir_filter_freq"] = self.canvas.ax1.plot(combedFilter.y,
-                                                combedFilter.x,
-                                                combedFilter.color) 
-            self.plot_refs["iir_comb_filter_freq"] = self.canvas.ax2.plot(combedFilter.y,
-                                                combedFilter.x,
-                                                combedFilter.color) 
-            self.plot_refs["iir_comb_filter_phase"] = self.canvas.ax3.plot(freq,
-                                                np.unwrap(np.angle(h)) * 180,
-                                                combedFilter.color)
-            self.plot_refs["iir_comb_filter_pz"] = self.canvas.ax4.plot(np.real(z),
-                                                np.imag(z),
-                                                combedFilter.color)
-       
-        # And add the functions to our extra list
-        self.signals[type+"_filter"] = combedFilter
-        self.signals[type+"_comb_filter_freq"] = combedFilter
-        self.signals[type+"_comb_filter_phase"] = combedFilter
-        self.signals[type+"_comb_filter_pz"] = combedFilter
-    
-        ## update Plots
-        if type == 'fir':
-            self.FIRplotsUpdate(1)
-        elif type == 'iir':
-            self.IIRplotsUpdate(1)
+        # One filter per type unless keys are given, e.g. 'iir Q=5'
+        if key is None:
+            key = type
+        if label is None:
+            label = key.upper() if key == type else key
+
+        # Already imported by loadFilters, unless addFilter is called right away
+        from combfilter import design_filter
+        from combmodel import FilterModel
+
+        # filter coeffs
+        with self.timer.stage('addFilter.design'):
+            b, a = design_filter(type, f_0, f_1, f_s, Q, numtaps)
+        self.designs[key] = (type, f_0, f_1, Q, numtaps)
+
+        # New parameters for a filter that is already shown - the next update of its panel recomputes it
+        if key in self.filters:
+            with self.compute_lock:
+                combedFilter = self.filters[key]
+                combedFilter.b, combedFilter.a, combedFilter.f_s = b, a, f_s
+                freq, mag_db = combedFilter.freq, combedFilter.prototype_mag_db
+            self.plot_refs[key]['prototype'].set_data(freq, mag_db)
+            self.canvas.growYLimits(self.plot_refs[key]['prototype'].axes, mag_db)
+            self.canvas.draw_idle()
+
+            panel = self.filterPanel(key)
+            self.requestUpdate(panel, self.sliders[panel].value())
+            return
+
+        # Create filter object - responses and roots are computed when they are first needed
+        combedFilter = FilterModel(b, a, f_s)
+
+        # Evaluate the prototype response once, every comb filter response is read from it
+        with self.timer.stage('addFilter.response'):
+            freq, mag_db, phase = combedFilter.freq, combedFilter.prototype_mag_db, combedFilter.phase * 180
+
+        # Get poles and zeros - the prototype is factored only once, the comb filter roots follow from it
+        with self.timer.stage('addFilter.tf2zpk'):
+            combedFilter.prototype_zpk
+
+        # SIGNAL - Add plot references of this filter - IIR panel on the left, FIR panel on the right
+        prototype_ax, freq_ax, phase_ax, pz_ax = self.canvas.panels[type]
+        index = len(self.panel_filters[type])
+        pz_lines = self.canvas.pz_lines[pz_ax]
+        self.plot_refs[key] = dict(prototype=prototype_ax.plot(freq, mag_db, color, label=label)[0],
+                                   freq=freq_ax.plot(freq, mag_db, color)[0],
+                                   phase=phase_ax.plot(freq, phase, color)[0],
+                                   pz=pz_lines[index] if index < len(pz_lines) else self.canvas.addPZLines(pz_ax))
+
+        # The comb filter lines are redrawn by blitting
+        for name in ('freq', 'phase'):
+            line = self.plot_refs[key][name]
+            self.canvas.addAnimated(line.axes, line)
+
+        # And add the filter to our list
+        self.filters[key] = combedFilter
+        self.colors[key] = color
+        self.panel_filters[type].append(key)
+        self.monitor_panel.addItem(label, key)
+
+        # Several filters in one panel - name them
+        if len(self.panel_filters[type]) > 1:
+            prototype_ax.legend(loc=1, fontsize='small')
+            self.canvas.draw_idle()
+
+        ## update Plots - the new filter takes the factor of its panel
+        self.plotsUpdate(type, self.sliders[type].value())
+
+
+    # The panel a filter is shown in
+    def filterPanel(self, key):
+        return next(panel for panel, keys in self.panel_filters.items() if key in keys)
 
 
     # Function to be called after using the slider
     def IIRplotsUpdate(self, value):
+        return self.plotsUpdate('iir', value)
+
+
+    # Function to be called after using the slider
+    def FIRplotsUpdate(self, value):
+        return self.plotsUpdate('fir', value)
+
+
+    # Compute and draw the comb filters of one panel right away, on the GUI thread
+    def plotsUpdate(self, type, value):
 
         # Does the original filter even exist?
-        if self.signals['iir_filter'] is None:
-            return False 
-        
-        # Get some data from our filter
-        f_s = self.signals['iir_comb_filter_freq'].f_s
-        a = self.signals['iir_comb_filter_freq'].a
-        b = self.signals['iir_comb_filter_freq'].b
-        
-        # Convert Filter to Comb Filter
-        b_comb, a_comb = combfilter(b,a, value)
-        
-        # Calculate frequency and amplitude
-        freq, h = signal.freqz(b_comb, a_comb, fs=f_s)
-        
-        # Only create comb filter if checkbox is True
-        if self.activateIIRCombFilter is True:
-            combedFilter = MySignal(freq, 20 * np.log10(abs(h)), 'g', f_s, b_comb, a_comb)
-        else: # else display the original uncombed filter
-            combedFilter = self.signals["iir_filter"]
-            combedFilter.color = 'r'
-        
-        # Get poles and zeros
-        z, p, k = signal.tf2zpk(b_comb, a_comb)
-        
-        ############# Update IIR Comb Filter Plot - Frequency Response##########
-        self.plot_refs['iir_comb_filter_freq'][0].set_ydata(combedFilter.x)
-        self.plot_refs['iir_comb_filter_freq'][0].set_xdata(combedFilter.y)
-        self.plot_refs['iir_comb_filter_freq'][0].set_color(combedFilter.color)
+        if not self.panel_filters.get(type):
+            return False
 
-        ############# Update IIR Comb Filter Plot - Phase Response ##########
-        self.plot_refs['iir_comb_filter_phase'][0].set_ydata(np.unwrap(np.angle(h)) * 180)
-        self.plot_refs['iir_comb_filter_phase'][0].set_xdata(freq)
-        self.plot_refs['iir_comb_filter_phase'][0].set_color(combedFilter.color)
+        # Anything the worker is computing right now is older than this
+        self.generation[type] += 1
+        self.applyUpdate(type, self.computeUpdate(type, value, self.isCombActive(type)))
+        return True
 
-        ############# Update IIR Comb Filter Plot- PZ Map ##########
-        self.canvas.ax4.cla()
-        self.canvas.ax4.add_patch(patches.Circle((0, 0), radius=1, fill=False, color='black', ls='dashed'))
-        self.canvas.ax4.plot(np.real(z), np.imag(z), 'oy', label='Zeros')
-        self.canvas.ax4.plot(np.real(p), np.imag(p), 'xb', label='Poles')
-        self.canvas.ax4.legend(loc=2)
-        self.canvas.ax4.set(title='IIR Comb Filter - PZ Map', xlabel='Real', ylabel='Imaginary')
 
-        self.canvas.draw()
+    def isCombActive(self, type):
+        return self.activateIIRCombFilter if type == 'iir' else self.activateFIRCombFilter
 
 
+    # Slider moved - queue the value, while a computation runs only the latest value per panel is kept
+    def requestUpdate(self, type, value):
+        if not self.panel_filters.get(type):
+            return
 
-    # Function to be called after using the slider
-    def FIRplotsUpdate(self, value):
-     
-        # Does the original filter even exist?
-        if self.signals['fir_filter'] is None:
-            return False 
-        
-        # Get some data from our filter
-        f_s = self.signals['fir_comb_filter_freq'].f_s
-        a = self.signals['fir_comb_filter_freq'].a
-        b = self.signals['fir_comb_filter_freq'].b
-        
-        # Convert Filter to Comb Filter
-        b_comb, a_comb = combfilter(b,a, value)
-        
-        # Calculate frequency and amplitude
-        freq, h = signal.freqz(b_comb, a_comb, fs=f_s)
-        
-        # Only create comb filter if checkbox is True
-        if self.activateFIRCombFilter is True:
-            combedFilter = MySignal(freq, 20 * np.log10(abs(h)), 'g', f_s, b_comb, a_comb)
-        else: # else display the original uncombed filter
-            combedFilter = self.signals["fir_filter"]
-            combedFilter.color = 'r'
-
-         # Get poles and zeros
-        z, p, k = signal.tf2zpk(b_comb, a_comb)
-        
-        ############# Update FIR Comb Filter Plot - Frequency Response##########
-        self.plot_refs['fir_comb_filter_freq'][0].set_ydata(combedFilter.x)
-        self.plot_refs['fir_comb_filter_freq'][0].set_xdata(combedFilter.y)
-        self.plot_refs['fir_comb_filter_freq'][0].set_color(combedFilter.color)
+        self.pending_updates[type] = value
+        if not self.busy[type]:
+            self.startNextUpdate(type)
 
-        ############# Update FIR Comb Filter Plot - Phase Response ##########
-        self.plot_refs['fir_comb_filter_phase'][0].set_ydata(np.unwrap(np.angle(h)) * 180)
-        self.plot_refs['fir_comb_filter_phase'][0].set_xdata(freq)
-        self.plot_refs['fir_comb_filter_phase'][0].set_color(combedFilter.color)
 
-        ############# Update FIR Comb Filter Plot- PZ Map ##########
-        self.canvas.ax8.cla()
-        self.canvas.ax8.add_patch(patches.Circle((0, 0), radius=1, fill=False, color='black', ls='dashed'))
-        self.canvas.ax8.plot(np.real(z), np.imag(z), 'oy', label='Zeros')
-        self.canvas.ax8.plot(np.real(p), np.imag(p), 'xb', label='Poles')
-        self.canvas.ax8.legend(loc=2)
-        self.canvas.ax8.set(title='FIR Comb Filter - PZ Map', xlabel='Real', ylabel='Imaginary')
+    # Hand the latest queued value of a panel to the worker thread
+    def startNextUpdate(self, type):
+        value = self.pending_updates.pop(type)
+        self.busy[type] = True
 
+        generation = self.generation[type]
+        future = self.worker.submit(self.computeUpdate, type, value, self.isCombActive(type))
+        # The signal crosses back into the GUI thread
+        future.add_done_callback(lambda f: self.updateReady.emit(type, (generation, f)))
 
-        
-        self.canvas.draw()
+
+    # Result from the worker thread - draw it unless it is outdated, then start the value queued in the meantime
+    def onUpdateReady(self, type, update):
+        generation, future = update
+        self.busy[type] = False
+        try:
+            if generation == self.generation[type]:
+                self.applyUpdate(type, future.result())
+        finally:
+            if type in self.pending_updates:
+                self.startNextUpdate(type)
+
+
+    # Everything numeric of a panel update - runs on the worker thread, does not touch any widget
+    def computeUpdate(self, type, value, active):
+        from combmodel import batch_freqz
+
+        keys = list(self.panel_filters[type])
+        models = [self.filters[key] for key in keys]
+
+        # A single filter turns green when combed, compared filters keep their own colors
+        compare = len(keys) > 1
+
+        with self.compute_lock:
+            # Set the factor - filters already at this factor keep their response
+            for combedFilter in models:
+                combedFilter.factor = value
+
+            # Calculate frequency and amplitude - H(e^jwM) of all changed filters of the panel in one batch
+            with self.timer.stage('freqz'):
+                batch_freqz(models)
+
+            filters = dict()
+            for key, combedFilter in zip(keys, models):
+
+                # Only show the comb filter if checkbox is True, else display the original uncombed filter
+                if active is True:
+                    mag_db, color = combedFilter.mag_db, self.colors[key] if compare else 'g'
+                else:
+                    mag_db, color = combedFilter.prototype_mag_db, self.colors[key]
+
+                # Get poles and zeros - the M-th roots of the prototype roots
+                with self.timer.stage('zpk'):
+                    z, p, k = combedFilter.zpk
+
+                filters[key] = dict(freq=combedFilter.freq, mag_db=mag_db, color=color,
+                                    phase=combedFilter.phase * 180, z=z, p=p)
+
+        # The monitor hears the comb filter only if it is shown
+        return dict(filters=filters, factor=value if active else 0)
+
+
+    # Put a computed panel update into the plots - GUI thread only
+    def applyUpdate(self, type, result):
+        if not result['filters']:
+            return
+
+        compare = len(self.panel_filters[type]) > 1
+        _, freq_ax, phase_ax, pz_ax = self.canvas.panels[type]
+
+        for key, update in result['filters'].items():
+            self.audio_filters[key] = (self.filters[key].b, self.filters[key].a, result['factor'])
+            refs = self.plot_refs[key]
+            zeros_line, poles_line = refs['pz']
+
+            ############# Update Comb Filter Plot - Frequency Response##########
+            refs['freq'].set_data(update['freq'], update['mag_db'])
+            refs['freq'].set_color(update['color'])
+
+            ############# Update Comb Filter Plot - Phase Response ##########
+            refs['phase'].set_data(update['freq'], update['phase'])
+            refs['phase'].set_color(update['color'])
+
+            ############# Update Comb Filter Plot- PZ Map ##########
+            zeros_line.set_data(np.real(update['z']), np.imag(update['z']))
+            poles_line.set_data(np.real(update['p']), np.imag(update['p']))
+            if compare:
+                zeros_line.set_color(self.colors[key])
+                poles_line.set_color(self.colors[key])
+
+        key = self.monitor_panel.currentData()
+        if key in result['filters']:
+            self.setMonitorFilter(key)
+
+        # Only if an axis range changed the whole figure is rendered again, else the three axes are blitted
+        updates = result['filters'].values()
+        rescaled = self.canvas.growYLimits(freq_ax, np.concatenate([u['mag_db'] for u in updates]))
+        rescaled |= self.canvas.growYLimits(phase_ax, np.concatenate([u['phase'] for u in updates]))
+        rescaled |= self.canvas.fitPZLimits(pz_ax, np.concatenate([u['z'] for u in updates]),
+                                            np.concatenate([u['p'] for u in updates]))
+
+        if rescaled:
+            self.canvas.draw_idle()
+        else:
+            self.canvas.blitAxes([freq_ax, phase_ax, pz_ax])
+
+        if self.timer.enabled:
+            cache = self.filters[next(iter(result['filters']))].cache.stats()
+            self.profile_label.setText('%s  |  cache %d/%d hits  |  %s' % (self.timer.summary(), cache['hits'],
+                                                                         cache['hits'] + cache['misses'],
+                                                                         self.startupText()))
+
+
+    # Import SciPy and the filter code on a background thread, add the filters on the GUI thread when done
+    # The import only starts after the first frame, so it does not hold up the first paint
+    def loadFilters(self, filters):
+        self.pending_filters = filters
+        if self.first_frame_time:
+            self.startLoading()
+
+
+    def startLoading(self):
+        filters, self.pending_filters = self.pending_filters, None
+
+        def load():
+            with self.timer.stage('import'):
+                import combmodel
+            self.filtersLoaded.emit(filters)
+
+        threading.Thread(target=load, daemon=True).start()
+
+
+    def onFiltersLoaded(self, filters):
+        for args in filters:
+            self.addFilter(*args)
+
+        self.ready_time = time.perf_counter() - start_time
+        self.showStartupTimes()
+
+
+    # The first paint is the first frame - measured once the paint is through
+    def paintEvent(self, event):
+        super(MainWindow, self).paintEvent(event)
+        if self.first_frame_time is None:
+            self.first_frame_time = 0
+            QtCore.QTimer.singleShot(0, self.reportFirstFrame)
+
+
+    def reportFirstFrame(self):
+        self.first_frame_time = time.perf_counter() - start_time
+        self.showStartupTimes()
+        if self.pending_filters:
+            self.startLoading()
+
+
+    # Startup times are shown in the profile label, only when profiling is on
+    def startupText(self):
+        times = [(name, t) for name, t in (('first frame', self.first_frame_time),
+                                           ('filters ready', self.ready_time)) if t]
+        return ', '.join('%s after %.0f ms' % (name, t * 1e3) for name, t in times)
+
+
+    def showStartupTimes(self):
+        if self.timer.enabled:
+            self.profile_label.setText(self.startupText())
+
+
+    # Live spectrogram on / off, also called when another source is picked
+    def monitorCheckBoxAction(self, state):
+        if Qt.Checked != state:
+            self.monitor.stop()
+            return
+
+        key = self.monitor_panel.currentData()
+        if key not in self.filters:
+            self.monitor_checkbox.setChecked(False)
+            return
+
+        source = self.monitor_source.currentText()
+        if source == 'WAV file ...':
+            path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open WAV file', '', 'WAV files (*.wav)')
+            if not path:
+                self.monitor_checkbox.setChecked(False)
+                return
+            source = WavSource(path)
+        elif source == 'White noise':
+            source = NoiseSource(self.filters[key].f_s)
+        else:
+            source = SquareSource(self.filters[key].f_s)
+
+        # A WAV file plays at its own rate - the filter is designed again for it, if it can be
+        if self.setMonitorFilter(key, source.f_s):
+            self.monitor.start(source)
+
+
+    # b, a, factor of a filter at the sampling frequency f_s - the plotted filter if f_s is its own
+    def monitorFilter(self, key, f_s):
+        b, a, factor = self.audio_filters[key]
+        if f_s != self.filters[key].f_s:
+            from combfilter import design_filter
+            type, f_0, f_1, Q, numtaps = self.designs[key]
+            b, a = design_filter(type, f_0, f_1, f_s, Q, numtaps)
+        return b, a, factor
+
+
+    # Hand a filter to the monitor at the rate it plays at - without a design for that rate the monitor stops
+    def setMonitorFilter(self, key, f_s=None):
+        if f_s is None:
+            f_s = self.monitor.f_s
+        try:
+            self.monitor.setFilter(*self.monitorFilter(key, f_s))
+        except ValueError as e:
+            self.monitor_checkbox.setChecked(False)
+            QtWidgets.QMessageBox.warning(self, 'Monitor', 'The filter can not be designed for %g Hz:\n%s' % (f_s, e))
+            return False
+        return True
+
+
+    # The monitor follows the other filter - the running stream crossfades to it
+    def monitorPanelAction(self, index):
+        key = self.monitor_panel.itemData(index)
+        if key in self.audio_filters:
+            self.setMonitorFilter(key)
+
+
+    # Stop the worker thread with the window, write the stage trace if asked for
+    def closeEvent(self, event):
+        self.worker.shutdown(wait=False)
+        self.monitor.stop()
+        if self.timer.enabled and os.environ.get('COMBFILTER_TRACE'):
+            self.timer.dump(os.environ['COMBFILTER_TRACE'])
+        super(MainWindow, self).closeEvent(event)
 
 # ---------------------------------------------------------------------------------------------    
 # MAIN
 # ---------------------------------------------------------------------------------------------    
-def main():
+def main(argv=None):
     # create square wave signal
     length = 1           # seconds
     f_s = 10000          # Hz - Sampling Frequency
@@ -440,6 +723,15 @@ def main():
     d_t = 1 / f_s        # discrete time steps    
     Q = 20               # Quality Factor
 
+    # Candidate designs - more than one value compares all combinations on the same axes
+    parser = argparse.ArgumentParser(description='Comb filter demonstration - FIR and IIR filters and their comb filters.')
+    parser.add_argument('--notch', type=float, nargs='+', default=[f_notch], help='IIR notch frequencies [Hz]')
+    parser.add_argument('--Q', type=float, nargs='+', default=[Q], help='quality factors of the IIR notch')
+    parser.add_argument('--f0', type=float, nargs='+', default=[f_0], help='FIR lower band edges [Hz]')
+    parser.add_argument('--f1', type=float, nargs='+', default=[f_1], help='FIR upper band edges [Hz]')
+    parser.add_argument('--numtaps', type=int, nargs='+', default=[37], help='lengths of the FIR filter')
+    args, qt_args = parser.parse_known_args(argv)
+
     # Create vector from 0 to 1 - stepsize = 1/fs
     # Calculate evenly spaced numbers over a specified interval.
     t = np.linspace(0, length, f_s, endpoint=False)
@@ -447,14 +739,32 @@ def main():
     # Fourier series of a square signal
     #x = myFourierSeries(fs, amplitude, t.shape[0], k_max_signal, f)
 
+    # One filter per type keeps the red lines and the key 'fir' / 'iir', several get a key and a color each
+    colors = itertools.cycle(['C%d' % i for i in range(10)])
+    filters = []
+    firs = list(itertools.product(args.f0, args.f1, args.numtaps))
+    for f_0, f_1, numtaps in firs:
+        if len(firs) == 1:
+            filters.append((f_0, f_1, f_s, d_t, 'r', 'fir', Q, numtaps))
+        else:
+            key = 'FIR %g-%g Hz, %d taps' % (f_0, f_1, numtaps)
+            filters.append((f_0, f_1, f_s, d_t, next(colors), 'fir', Q, numtaps, key))
+    iirs = list(itertools.product(args.notch, args.Q))
+    for notch, Q in iirs:
+        if len(iirs) == 1:
+            filters.append((notch, f_1, f_s, d_t, 'r', 'iir', Q))
+        else:
+            key = 'IIR %g Hz, Q=%g' % (notch, Q)
+            filters.append((notch, f_1, f_s, d_t, next(colors), 'iir', Q, 37, key))
+
     # Our Application
-    app = QtWidgets.QApplication(sys.argv)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     mainWindow = MainWindow()
 
     # Add a function to our Application - y, x, color, name, sample frequency, duration in seconds
     #mainWindow.addFunction(t, x, 'r', 'square signal', fs, length)
-    mainWindow.addFilter(f_0, f_1, f_s, d_t, 'r', 'fir', Q)
-    mainWindow.addFilter(f_notch, f_1,f_s, d_t,'r', 'iir', Q)
+    # The window shows right away, the filters are designed once SciPy is loaded
+    mainWindow.loadFilters(filters)
 
     app.exec_()
 
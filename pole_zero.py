@@ -1,45 +1,172 @@
-def pzmap(G, ax=None, marker_color = None):
-    
-    if marker_color:
-        marker_color = [marker_color, marker_color]
-    else:
-        marker_color = ["r", "b"]
-            
-    
-    if ax:
-        actual_imag_min, actual_imag_max = ax.get_ylim()
-        actual_real_min, actual_real_max = ax.get_xlim()
-    else:
-        _, ax = plt.subplots(figsize=(5, 5))
-    
-    if ax.lines == []:
-        # circle
+import weakref
+import numpy as np
+import matplotlib.pyplot as plt
+
+# The PZMap of each axes, dropped together with the axes
+_pzmaps = weakref.WeakKeyDictionary()
+
+
+# Group index of every root and the size of each group on a tol x tol grid
+def _cells(roots, tol):
+    cells = np.round(np.stack((roots.real, roots.imag), axis=1) / tol)
+    _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    return inverse.ravel(), counts
+
+
+# Merge roots closer than tol into one marker - returns the merged roots and how many roots each one stands for
+def merge_roots(roots, tol=1e-3, max_markers=None):
+    """
+    Parameters
+    ----------
+    roots:        array[complex], poles or zeros
+    tol:          double, roots on the same tol x tol grid cell are merged
+    max_markers:  int, if given the grid is coarsened until at most this many markers are left
+
+    Returns
+    ---------
+    merged:       array[complex], mean position of each group
+    counts:       array[int], multiplicity of each group within tol - 0 for a marker that only stands
+                  for several distinct roots because of max_markers
+    """
+
+    roots = np.asarray(roots, dtype=complex).ravel()
+    if roots.shape[0] == 0:
+        return roots, np.zeros(0, dtype=int)
+
+    fine, counts = _cells(roots, tol)
+    inverse, sizes = fine, counts
+    coarse = tol
+    while max_markers is not None and sizes.shape[0] > max_markers:
+        coarse *= 2
+        inverse, sizes = _cells(roots, coarse)
+
+    # Distinct roots that only share a marker on the coarse grid are no multiplicity
+    if coarse != tol:
+        groups = np.unique(np.stack((inverse, fine), axis=1), axis=0)[:, 0]
+        counts = np.where(np.bincount(groups, minlength=sizes.shape[0]) == 1, sizes, 0)
+
+    merged = np.bincount(inverse, weights=roots.real) / sizes + 1j * np.bincount(inverse, weights=roots.imag) / sizes
+    return merged, counts
+
+
+# PZ map whose artists are created once per filter and only moved on updates
+class PZMap(object):
+    """
+    The axes owns the artists, the PZMap only keeps weak references to the axes and its
+    artists - so the entry in _pzmaps goes away with the axes.
+
+    Parameters
+    ----------
+    ax:           matplotlib axes, created if None
+    tol:          double, roots closer than this are drawn as one marker with its multiplicity
+    max_markers:  int, upper bound of markers per filter and root type
+    max_labels:   int, upper bound of multiplicity labels per filter and root type, the largest are shown
+    """
+
+    def __init__(self, ax=None, tol=1e-3, max_markers=500, max_labels=50):
+        if ax is None:
+            _, ax = plt.subplots(figsize=(5, 5))
+        self._ax = weakref.ref(ax)
+        self.tol = tol
+        self.max_markers = max_markers
+        self.max_labels = max_labels
+        self.filters = dict()
+
+        # circle and axes - only once
         theta = np.linspace(-np.pi, np.pi, 201)
-        ax.plot(np.sin(theta), np.cos(theta), color = 'k', linewidth=0.5)
+        self.circle = weakref.proxy(ax.plot(np.sin(theta), np.cos(theta), color='k', linewidth=0.5)[0])
         ax.axhline(y=0, color='k', alpha=0.3)
-        ax.axvline(x=0, color='k', alpha=0.3) 
-        actual_imag_min, actual_imag_max = -1.0, 1.0
-        actual_real_min, actual_real_max = -1.0, 1.0
-       
-    # poles
-    ax.plot(np.real(G.poles), np.imag(G.poles), 'X%s' % marker_color[0], label = 'Poles')
-
-    # zeros
-    ax.plot(np.real(G.zeros), np.imag(G.zeros), '.%s' % marker_color[1], label = 'Zeros')
-    
-    def make_one_long(a, b, c):
-        a = np.array(a)
-        gesamt = np.append(a, b)
-        return np.append(gesamt, c)
-
-    imag_min = np.min(make_one_long([actual_imag_min], np.imag(G.poles), np.imag(G.zeros))) * 1.05
-    imag_max = np.max(make_one_long([actual_imag_max], np.imag(G.poles), np.imag(G.zeros))) * 1.05
-    real_min = np.min(make_one_long([actual_real_min], np.real(G.poles), np.real(G.zeros))) * 1.05
-    real_max = np.max(make_one_long([actual_real_max], np.real(G.poles), np.real(G.zeros))) * 1.05
-    all_lim = np.max([np.abs(real_min), real_max, np.abs(imag_min), imag_max])
-    ax.set_xlim(-all_lim, all_lim)
-    ax.set_ylim(-all_lim, all_lim) 
-        
-    ax.legend(loc=1)
-    ax.grid()
-    return ax
+        ax.axvline(x=0, color='k', alpha=0.3)
+        ax.grid()
+
+    @property
+    def ax(self):
+        return self._ax()
+
+    # ax.cla() removes the artists from the axes - the map has to be built again
+    def stale(self):
+        lines = [self.circle] + [f[name] for f in self.filters.values() for name in ('poles', 'zeros')]
+        try:
+            return any(line.axes is None for line in lines)
+        except ReferenceError:
+            return True
+
+    # Text artists for the multiplicities - reused, extra ones are hidden
+    def _annotate(self, pool, roots, counts, color):
+        many = np.flatnonzero(counts > 1)
+        many = many[np.argsort(-counts[many], kind='stable')[:self.max_labels]]
+        for i, (root, count) in enumerate(zip(roots[many], counts[many])):
+            if i == len(pool):
+                pool.append(weakref.proxy(self.ax.text(0, 0, '', fontsize=7, ha='left', va='bottom')))
+            pool[i].set_position((root.real, root.imag))
+            pool[i].set_text(str(count))
+            pool[i].set_color(color)
+            pool[i].set_visible(True)
+        for text in pool[many.shape[0]:]:
+            text.set_visible(False)
+
+    def update(self, key, zeros, poles, marker_color=None):
+        """
+        Add the filter key or move its markers to the new zeros and poles.
+
+        Parameters
+        ----------
+        key:          hashable, name of the filter
+        zeros,poles:  array[complex], zeros and poles of the filter
+        marker_color: string, one matplotlib color for poles and zeros, default red poles and blue zeros
+        """
+
+        colors = [marker_color, marker_color] if marker_color else ["r", "b"]
+
+        if key not in self.filters:
+            # poles, zeros - only the first filter goes into the legend
+            first = not self.filters
+            pole_line, = self.ax.plot([], [], 'X', color=colors[0], label='Poles' if first else '_nolegend_')
+            zero_line, = self.ax.plot([], [], '.', color=colors[1], label='Zeros' if first else '_nolegend_')
+            self.filters[key] = dict(poles=weakref.proxy(pole_line), zeros=weakref.proxy(zero_line),
+                                     pole_text=[], zero_text=[], extent=1.0)
+            if first:
+                self.ax.legend(loc=1)
+
+        artists = self.filters[key]
+        poles, pole_counts = merge_roots(poles, self.tol, self.max_markers)
+        zeros, zero_counts = merge_roots(zeros, self.tol, self.max_markers)
+
+        artists['poles'].set_data(poles.real, poles.imag)
+        artists['zeros'].set_data(zeros.real, zeros.imag)
+        self._annotate(artists['pole_text'], poles, pole_counts, colors[0])
+        self._annotate(artists['zero_text'], zeros, zero_counts, colors[1])
+
+        # symmetric limits over the unit circle and all roots of all filters - one reduction per update
+        roots = np.concatenate((poles, zeros))
+        artists['extent'] = np.max(np.abs(np.concatenate(([1.0], roots.real, roots.imag))))
+        all_lim = max(f['extent'] for f in self.filters.values()) * 1.05
+        self.ax.set_xlim(-all_lim, all_lim)
+        self.ax.set_ylim(-all_lim, all_lim)
+
+
+def pzmap(G, ax=None, marker_color = None, key=None):
+    """
+    Parameters
+    ----------
+    G:            object with poles and zeros, e.g. a control.TransferFunction
+    ax:           matplotlib axes, a new figure if None
+    marker_color: string, one color for poles and zeros, default red poles and blue zeros
+    key:          hashable, calling again with the same key moves that filter's markers,
+                  without a key every call adds another filter to the map
+
+    Returns
+    ---------
+    ax:           the matplotlib axes
+    """
+
+    # One PZMap per axes, it keeps the artists between calls - a cleared axes gets a new one
+    pz = _pzmaps.get(ax) if ax is not None else None
+    if pz is None or pz.stale():
+        pz = PZMap(ax)
+        _pzmaps[pz.ax] = pz
+
+    if key is None:
+        key = len(pz.filters)
+    pz.update(key, G.zeros, G.poles, marker_color)
+    return pz.ax